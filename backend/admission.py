@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from profiling import stage
+
+
+class KeyPolicy:
+    """Limits for one API key (tenant)."""
+
+    def __init__(self, rate: float = 5.0, burst: int = 10, max_concurrent: int = 4, weight: float = 1.0):
+        self.rate = rate                      # requests per second refilled into the bucket
+        self.burst = burst                    # bucket size
+        self.max_concurrent = max_concurrent  # requests in flight at once
+        self.weight = weight                  # share of the LLM scheduler
+
+    def to_dict(self) -> dict:
+        return {"rate": self.rate, "burst": self.burst, "max_concurrent": self.max_concurrent, "weight": self.weight}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take `cost` tokens, or return how many seconds until that is possible."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        if self.rate <= 0:
+            return False, 60.0
+        return False, (cost - self.tokens) / self.rate
+
+
+def _new_usage() -> dict:
+    return {
+        "requests": 0,
+        "rejected": 0,
+        "in_flight": 0,
+        "tokens_in": 0,
+        "tokens_out": 0,
+        "embedding_calls": 0,
+        "llm_calls": 0,
+        "llm_wait_seconds": 0.0,
+    }
+
+
+class AdmissionController:
+    """
+    Per-key token-bucket rate limits and concurrent request caps, plus the
+    usage counters used for capacity planning.
+    """
+
+    def __init__(self, policies: Optional[Dict[str, KeyPolicy]] = None, default_policy: Optional[KeyPolicy] = None,
+                 prune_every: int = 1024):
+        self.policies = policies or {}
+        self.default_policy = default_policy or KeyPolicy()
+        self.prune_every = prune_every
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._usage: Dict[str, dict] = {}
+        self._admitted = 0
+
+    def policy(self, key: str) -> KeyPolicy:
+        return self.policies.get(key, self.default_policy)
+
+    def usage_for(self, key: str) -> dict:
+        if key not in self._usage:
+            self._usage[key] = _new_usage()
+        return self._usage[key]
+
+    def admit(self, key: str) -> Tuple[bool, float, str]:
+        """Return (admitted, retry_after seconds, reason). Call release() once done."""
+        policy = self.policy(key)
+        usage = self.usage_for(key)
+        if usage["in_flight"] >= policy.max_concurrent:
+            usage["rejected"] += 1
+            return False, 1.0, "Too many concurrent requests"
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(policy.rate, policy.burst)
+        allowed, retry_after = bucket.try_acquire()
+        if not allowed:
+            usage["rejected"] += 1
+            return False, retry_after, "Rate limit exceeded"
+
+        usage["requests"] += 1
+        usage["in_flight"] += 1
+        self._admitted += 1
+        if self._admitted % self.prune_every == 0:
+            self.prune()
+        return True, 0.0, ""
+
+    def prune(self, fold_into: str = "anonymous") -> int:
+        """
+        Forget idle keys that have no policy of their own (per-address
+        anonymous callers), so their state doesn't grow without bound. A key
+        is idle once its bucket has refilled and nothing is in flight; its
+        counters are added to `fold_into` so usage totals stay complete.
+        """
+        now = time.monotonic()
+        pruned = 0
+        for key in list(self._usage):
+            if key in self.policies or key == fold_into or self._usage[key]["in_flight"]:
+                continue
+            bucket = self._buckets.get(key)
+            if bucket is not None and bucket.tokens + (now - bucket.updated) * bucket.rate < bucket.capacity:
+                continue
+            usage = self._usage.pop(key)
+            self._buckets.pop(key, None)
+            totals = self.usage_for(fold_into)
+            for name, value in usage.items():
+                if name != "in_flight":
+                    totals[name] += value
+            pruned += 1
+        return pruned
+
+    def release(self, key: str) -> None:
+        usage = self.usage_for(key)
+        usage["in_flight"] = max(0, usage["in_flight"] - 1)
+
+    def record(self, key: str, **counters) -> None:
+        usage = self.usage_for(key)
+        for name, value in counters.items():
+            usage[name] += value or 0
+
+    def usage(self) -> dict:
+        return {key: dict(usage, policy=self.policy(key).to_dict()) for key, usage in self._usage.items()}
+
+
+class FairScheduler:
+    """
+    Weighted fair queuing for LLM calls. At most `capacity` calls run at once;
+    when callers have to wait, the one with the smallest virtual finish time
+    goes next, so a key with weight 2 gets twice the turns of a key with
+    weight 1 and a single busy key can't starve the rest.
+    """
+
+    def __init__(self, capacity: int, controller: Optional[AdmissionController] = None):
+        self.capacity = capacity
+        self.controller = controller
+        self.running = 0
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._waiting = []  # heap of (finish tag, sequence, future)
+        self._sequence = itertools.count()
+
+    def _weight(self, key: str) -> float:
+        if self.controller is None:
+            return 1.0
+        return max(self.controller.policy(key).weight, 1e-6)
+
+    def _dispatch(self) -> None:
+        while self._waiting and self.running < self.capacity:
+            finish, _, future = heapq.heappop(self._waiting)
+            if future.done():  # cancelled while queued
+                continue
+            self._virtual_time = max(self._virtual_time, finish)
+            self.running += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, key: str, cost: float = 1.0):
+        start = max(self._virtual_time, self._last_finish.get(key, 0.0))
+        finish = start + cost / self._weight(key)
+        self._last_finish[key] = finish
+
+        queued_at = time.perf_counter()
+        if self.running < self.capacity and not self._waiting:
+            self.running += 1
+            self._virtual_time = max(self._virtual_time, start)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (finish, next(self._sequence), future))
+            try:
+                with stage("llm_queue"):
+                    await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # the slot was handed over just as we were cancelled
+                    self.running -= 1
+                    self._dispatch()
+                raise
+        if self.controller is not None:
+            self.controller.record(key, llm_calls=1, llm_wait_seconds=time.perf_counter() - queued_at)
+
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._dispatch()
+            # a finish tag already passed by the virtual clock no longer matters
+            if self._last_finish.get(key, 0.0) <= self._virtual_time:
+                self._last_finish.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"capacity": self.capacity, "running": self.running, "waiting": len(self._waiting)}
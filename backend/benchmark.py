@@ -0,0 +1,148 @@
+import io
+import os
+import sys
+import time
+import zipfile
+
+import numpy as np
+
+from parsers import extract_text_from_docx, extract_text_from_txt
+from sharded_index import ShardedSearcher
+from vector_store import STORAGE_MODES, EmbeddingStore, normalize, recall_at_k
+
+# Synthetic benchmarks that don't need the embedding model or Ollama.
+# Usage: python benchmark.py [storage] [shards] [parsers]
+
+
+def _random_embeddings(rows: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # clustered data is closer to real sentence embeddings than pure noise
+    centers = rng.standard_normal((max(1, rows // 100), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), rows)
+    return centers[labels] + 0.5 * rng.standard_normal((rows, dim)).astype(np.float32)
+
+
+def bench_storage(rows: int = 100_000, dim: int = 384, queries: int = 200, k: int = 10):
+    data = _random_embeddings(rows, dim)
+    query_set = data[np.random.default_rng(1).integers(0, rows, queries)]
+    query_set = query_set + 0.3 * np.random.default_rng(2).standard_normal(query_set.shape).astype(np.float32)
+
+    exact = EmbeddingStore("float32")
+    exact.build(data)
+
+    print(f"storage: {rows} rows x {dim} dims, {queries} queries, k={k}")
+    print(f"{'mode':<8} {'memory MB':>10} {'disk MB':>8} {'ms/query':>9} {'recall@k':>9}")
+    for mode in STORAGE_MODES:
+        store = exact if mode == "float32" else EmbeddingStore(mode)
+        if store is not exact:
+            store.build(data)
+        start = time.perf_counter()
+        for query in query_set:
+            store.search(query, k)
+        elapsed = (time.perf_counter() - start) * 1000 / queries
+        recall = recall_at_k(store, exact, query_set, k)
+        print(f"{mode:<8} {store.memory_bytes() / 2**20:>10.1f} {store.disk_bytes() / 2**20:>8.1f} "
+              f"{elapsed:>9.2f} {recall:>9.3f}")
+
+
+def bench_shards(rows: int = 1_000_000, dim: int = 384, queries: int = 50, k: int = 10):
+    data = normalize(_random_embeddings(rows, dim))
+    query_set = normalize(data[np.random.default_rng(1).integers(0, rows, queries)])
+
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    print(f"shards: {rows} rows x {dim} dims ({data.nbytes / 2**20:.0f} MB), {queries} queries, k={k}")
+    print(f"{'shards':>6} {'ms/query':>9} {'speedup':>8}")
+
+    single = EmbeddingStore("float32")
+    single.build(data)
+    start = time.perf_counter()
+    for query in query_set:
+        single.search(query, k)
+    baseline = (time.perf_counter() - start) * 1000 / queries
+    print(f"{'inline':>6} {baseline:>9.2f} {1.0:>8.2f}")
+
+    for count in counts:
+        searcher = ShardedSearcher(count)
+        searcher.start()
+        try:
+            searcher.load(data)
+            searcher.search(query_set[0], k)  # warm up the workers
+            start = time.perf_counter()
+            for query in query_set:
+                searcher.search(query, k)
+            elapsed = (time.perf_counter() - start) * 1000 / queries
+        finally:
+            searcher.close()
+        print(f"{count:>6} {elapsed:>9.2f} {baseline / elapsed:>8.2f}")
+
+
+def _synthetic_docx(paragraphs: int) -> bytes:
+    w = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    body = []
+    for i in range(paragraphs):
+        body.append(f"<w:p><w:r><w:t>Paragraph {i} with some ordinary sentence text in it.</w:t></w:r></w:p>")
+        if i % 50 == 0:
+            cells = "".join(f"<w:tc><w:p><w:r><w:t>cell {i}.{c}</w:t></w:r></w:p></w:tc>" for c in range(4))
+            body.append(f"<w:tbl>{''.join(f'<w:tr>{cells}</w:tr>' for _ in range(5))}</w:tbl>")
+    xml = f'<?xml version="1.0"?><w:document {w}><w:body>{"".join(body)}</w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml",
+                         '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                         '<Default Extension="xml" ContentType="application/xml"/>'
+                         '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-'
+                         'officedocument.wordprocessingml.document.main+xml"/></Types>')
+        archive.writestr("_rels/.rels",
+                         '<?xml version="1.0"?><Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/'
+                         'relationships/officeDocument" Target="word/document.xml"/></Relationships>')
+        archive.writestr("word/document.xml", xml)
+    return buffer.getvalue()
+
+
+def _throughput(parse, data: bytes, size: int, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(io.BytesIO(data))
+        best = min(best, time.perf_counter() - start)
+    return size / 2**20 / best
+
+
+def bench_parsers(paragraphs: int = 50_000, text_mb: int = 20):
+    print(f"parsers: docx with {paragraphs} paragraphs, {text_mb} MB text files")
+    # docx throughput is measured on the uncompressed document.xml
+    print(f"{'format':<22} {'input MB':>9} {'MB/s':>8}")
+
+    docx = _synthetic_docx(paragraphs)
+    with zipfile.ZipFile(io.BytesIO(docx)) as archive:
+        docx_size = archive.getinfo("word/document.xml").file_size
+    results = [("docx (iterparse)", docx, docx_size, extract_text_from_docx)]
+    try:
+        from docx import Document
+        results.append(("docx (python-docx)", docx, docx_size,
+                        lambda f: "\n".join(p.text for p in Document(f).paragraphs)))
+    except ImportError:
+        pass
+
+    line = "Plain text line with caf\u00e9 and na\u00efve words in it.\n"
+    text = line * (text_mb * 2**20 // len(line))
+    for encoding in ("utf-8", "cp1252", "utf-16"):
+        data = text.encode(encoding)
+        results.append((f"txt ({encoding})", data, len(data), extract_text_from_txt))
+
+    for name, data, size, parse in results:
+        print(f"{name:<22} {size / 2**20:>9.1f} {_throughput(parse, data, size):>8.1f}")
+
+
+BENCHMARKS = {
+    "storage": bench_storage,
+    "shards": bench_shards,
+    "parsers": bench_parsers,
+}
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        BENCHMARKS[name]()
@@ -2,16 +2,11 @@ import os
 import sys
 
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
-from starlette.responses import StreamingResponse, JSONResponse  # Import JSONResponse for custom responses
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, BackgroundTasks
+from starlette.responses import StreamingResponse, JSONResponse, PlainTextResponse  # Import JSONResponse for custom responses
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from PyPDF2 import PdfReader
-from docx import Document
+from pydantic import BaseModel, confloat, conint
 from typing import List, Optional
-from sentence_transformers import SentenceTransformer
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import tempfile
 import uvicorn
 from ollama import AsyncClient
@@ -20,31 +15,130 @@ import json
 from PIL import Image
 import io
 import base64
+import math
+import hashlib
+from contextlib import ExitStack
+from contextvars import ContextVar
+from admission import AdmissionController, FairScheduler, KeyPolicy
+from chunking import chunk_text
+from corpus import DocumentData
+from embedding_models import EmbeddingModelRegistry
+from memory_accounting import MemoryAccountant, MemoryBudgetExceeded
+from model_catalog import ModelCatalog
+from model_residency import OllamaResidencyBackend, ResidencyManager
+from profiling import Profiler, stage
+from prompts import default_library
+from parsers import SUPPORTED_EXTENSIONS, ParsedTextCache, content_key, parse_pages
+from reranker import Reranker
+from sharded_index import ShardedSearcher
 
 app = FastAPI()
 
-# CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # api key validation
 API_KEYS = {"your_api_key_1": "user_a", "your_api_key_2": "user_b"}  # Replace with your actual API keys
 
+# Per-user limits, users without an entry get the default policy. Requests
+# without an API key are limited per client address, as "anonymous:<ip>".
+API_KEY_POLICIES = {
+    "user_a": KeyPolicy(rate=5, burst=10, max_concurrent=4, weight=1),
+    "user_b": KeyPolicy(rate=5, burst=10, max_concurrent=4, weight=1),
+}
+default_policy = KeyPolicy(
+    rate=float(os.environ.get("RATE_LIMIT_RPS", "5")),
+    burst=int(os.environ.get("RATE_LIMIT_BURST", "10")),
+    max_concurrent=int(os.environ.get("MAX_CONCURRENT_PER_KEY", "4")),
+)
+admission = AdmissionController(API_KEY_POLICIES, default_policy)
+# at most LLM_CONCURRENCY Ollama calls run at once, shared fairly between keys
+llm_scheduler = FairScheduler(int(os.environ.get("LLM_CONCURRENCY", "2")), admission)
+current_tenant = ContextVar("current_tenant", default="anonymous")
+
+# Profiling: a request with a valid X-API-Key and an "X-Profile: 1" header
+# or "?profile=1" gets a stage breakdown (Server-Timing header) and sampled
+# stacks, stored under /api/admin/profiles. With PROFILE_SLOW_MS set every
+# request is timed and those slower than that are kept too, the newest
+# PROFILE_CAPTURES of them.
+profiler = Profiler(
+    slow_ms=float(os.environ.get("PROFILE_SLOW_MS", "0")),
+    capacity=int(os.environ.get("PROFILE_CAPTURES", "50")),
+    sample_interval=float(os.environ.get("PROFILE_SAMPLE_MS", "5")) / 1000,
+)
+
+def profile_requested(request: Request, api_key: Optional[str]) -> bool:
+    # stack sampling costs a thread per request, only key holders may ask for it
+    if api_key not in API_KEYS:
+        return False
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+async def release_after_body(body_iterator, release):
+    # streaming responses are still running when call_next returns
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        release()
+
+# cheap reads served from memory, e.g. the frontend polling /models
+ADMISSION_EXEMPT = {"/", "/models"}
+
+def request_tenant(request: Request, api_key: Optional[str]) -> str:
+    if api_key in API_KEYS:
+        return API_KEYS[api_key]
+    # no proxy headers are trusted, behind a proxy this is the proxy's address
+    return f"anonymous:{request.client.host if request.client else 'unknown'}"
+
 # API Key Validation Middleware
 @app.middleware("http")
 async def api_key_middleware(request: Request, call_next):
+    api_key = request.headers.get("X-API-Key")
     if request.url.path.startswith("/api"):
-        api_key = request.headers.get("X-API-Key")
         if api_key is None or api_key not in API_KEYS:
             return JSONResponse({"detail": "Invalid API Key"}, status_code=401)
-    response = await call_next(request)  # Await the next middleware or endpoint
+    if request.method == "OPTIONS" or (request.method == "GET" and request.url.path in ADMISSION_EXEMPT):
+        return await call_next(request)
+
+    tenant = request_tenant(request, api_key)
+    admitted, retry_after, reason = admission.admit(tenant)
+    if not admitted:
+        return JSONResponse({"detail": reason}, status_code=429,
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+    current_tenant.set(tenant)
+    profile, token = profiler.begin(request.method, request.url.path, profile_requested(request, api_key))
+    try:
+        response = await call_next(request)  # Await the next middleware or endpoint
+    except Exception:
+        admission.release(tenant)
+        if profile is not None:
+            profiler.end(profile, 500)
+        raise
+    finally:
+        if token is not None:
+            profiler.detach(token)
+    if profile is None:
+        response.body_iterator = release_after_body(response.body_iterator, lambda: admission.release(tenant))
+        return response
+
+    # a streaming body is still running, its stages only show up in the capture
+    response.headers["X-Profile-Id"] = profile.id
+    response.headers["Server-Timing"] = profile.server_timing()
+
+    def release():
+        admission.release(tenant)
+        profiler.end(profile, response.status_code)
+    response.body_iterator = release_after_body(response.body_iterator, release)
     return response
 
+# CORS configuration. Registered after the middleware above so it wraps it
+# and 401/429 responses carry CORS headers too.
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Profile-Id", "Server-Timing"],
+)
 
 
 #test api
@@ -53,20 +147,110 @@ def test_api(request:Request):
     
     return {"msg":"working api key"}
 
-
-# Initialize embedding model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+@app.get("/api/admin/profiles")
+def list_profiles():
+    return {"profiles": profiler.list(), "stats": profiler.stats()}
+
+@app.get("/api/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = "json"):
+    """Download a capture, format=collapsed gives the stacks for flamegraph.pl or speedscope."""
+    profile = profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed(), headers={
+            "Content-Disposition": f'attachment; filename="profile-{profile_id}.txt"'})
+    return profile.to_dict()
+
+@app.get("/api/admin/memory")
+def get_memory_breakdown():
+    return memory.breakdown()
+
+@app.get("/api/usage")
+def get_usage():
+    return {"usage": admission.usage(), "llm_scheduler": llm_scheduler.stats()}
+
+
+# Sharded search: with SEARCH_SHARDS > 1, float32 corpora of at least
+# SHARD_MIN_ROWS rows are scored by that many worker processes in parallel.
+# The workers are forked here, before any model is loaded or thread started.
+SEARCH_SHARDS = int(os.environ.get("SEARCH_SHARDS", "0"))
+SHARD_MIN_ROWS = int(os.environ.get("SHARD_MIN_ROWS", "50000"))
+sharded_searcher = ShardedSearcher(SEARCH_SHARDS) if SEARCH_SHARDS > 1 else None
+if sharded_searcher is not None:
+    sharded_searcher.start()
+
+# Embedding models are loaded on first use; EMBEDDING_MODEL is the one a
+# fresh corpus starts with, /api/admin/embedding-model migrates to another.
+embedding_models = EmbeddingModelRegistry()
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+MIGRATION_BATCH_SIZE = int(os.environ.get("MIGRATION_BATCH_SIZE", "64"))
+MIGRATION_PAUSE_SECONDS = float(os.environ.get("MIGRATION_PAUSE_SECONDS", "0.05"))
+
+# Embedding storage: "float32", "int8" or "binary". The compact modes rescore
+# a shortlist of EMBEDDING_RESCORE_FACTOR * top_k rows with the full vectors.
+EMBEDDING_STORAGE = os.environ.get("EMBEDDING_STORAGE", "float32")
+EMBEDDING_RESCORE_FACTOR = int(os.environ.get("EMBEDDING_RESCORE_FACTOR", "4"))
+
+# Rewrite the corpus once this fraction of its rows are tombstones
+COMPACTION_THRESHOLD = float(os.environ.get("COMPACTION_THRESHOLD", "0.3"))
+
+# Optional cross-encoder rerank stage: pull RERANK_CANDIDATES rows from the
+# bi-encoder, rescore them within RERANK_BUDGET_MS and keep the best top_k.
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "0") == "1"
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", "20"))
+reranker = Reranker(
+    model_name=os.environ.get("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+    batch_size=int(os.environ.get("RERANK_BATCH_SIZE", "8")),
+    budget_ms=float(os.environ.get("RERANK_BUDGET_MS", "150")),
+)
+if RERANK_ENABLED:
+    reranker.load()  # keep model loading out of the first request's budget
 
 # Initialize Ollama client
 ollama = AsyncClient(host='http://localhost:11434')
 
-class DocumentData:
-    def __init__(self):
-        self.text = ""
-        self.chunks = []
-        self.embeddings = None
+# Model list cached for MODEL_CATALOG_TTL seconds and refreshed in the background
+model_catalog = ModelCatalog(ollama, ttl=float(os.environ.get("MODEL_CATALOG_TTL", "60")))
+
+# Keeps frequently used models loaded: PRELOAD_MODELS are loaded at startup,
+# keep_alive follows each model's request rate and cold models are unloaded
+# when the resident set goes over MODEL_MEMORY_BUDGET_MB (0 = no limit).
+def catalog_model_size(model: str) -> Optional[int]:
+    entry = model_catalog.models.get(model)
+    return entry["size"] if entry else None
+
+residency = ResidencyManager(
+    OllamaResidencyBackend(ollama),
+    memory_budget=int(float(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0")) * 2**20),
+    preload=[m for m in os.environ.get("PRELOAD_MODELS", "gemma3").split(",") if m],
+    size_of=catalog_model_size,
+)
+
+@app.on_event("startup")
+async def start_model_catalog():
+    model_catalog.start()
+    residency.start(interval=float(os.environ.get("RESIDENCY_INTERVAL", "30")))
+
+@app.on_event("shutdown")
+def stop_model_catalog():
+    model_catalog.stop()
+    residency.stop()
+
+async def ensure_known_model(model: str) -> None:
+    # unknown models fail here instead of after a round trip to Ollama,
+    # if the catalog was never loaded the request goes through unchecked
+    if await model_catalog.contains(model) is False:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model}")
 
-doc_data = DocumentData()
+doc_data = DocumentData(embedding_models.encoder(EMBEDDING_MODEL), EMBEDDING_STORAGE, EMBEDDING_RESCORE_FACTOR,
+                        sharded=sharded_searcher, shard_min_rows=SHARD_MIN_ROWS,
+                        embedding_model=EMBEDDING_MODEL, embedding_dim=embedding_models.dimension(EMBEDDING_MODEL))
+
+@app.on_event("shutdown")
+def stop_shard_workers():
+    if sharded_searcher is not None:
+        sharded_searcher.close()
 
 class ChatMessage(BaseModel):
     role: str
@@ -76,145 +260,278 @@ class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     model: str = "gemma3"
     streaming:bool  = False  # default model
-
-def extract_text_from_pdf(file_path: str) -> str:
-    text = ""
-    with open(file_path, "rb") as f:
-        reader = PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-def extract_text_from_docx(file_path: str) -> str:
-    doc = Document(file_path)
-    return "\n".join([para.text for para in doc.paragraphs])
-
-def extract_text_from_txt(file_path: str) -> str:
-    with open(file_path, "r") as f:
-        return f.read()
-
-def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
-    words = text.split()
-    chunks = []
-    current_chunk = []
-    current_length = 0
-
-    for word in words:
-        if current_length + len(word) + 1 <= chunk_size:
-            current_chunk.append(word)
-            current_length += len(word) + 1
-        else:
-            chunks.append(" ".join(current_chunk))
-            current_chunk = [word]
-            current_length = len(word)
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
+    # chunk metadata filter, see MetadataIndex. Left out, only the latest
+    # upload is searched like before; {} searches every document.
+    filters: Optional[dict] = None
+    top_k: conint(ge=1, le=50) = 3  # chunks sent to the model as context
+    rerank: Optional[bool] = None  # defaults to RERANK_ENABLED, ignored when that is off
+    rerank_budget_ms: Optional[confloat(ge=0, le=10000)] = None
+
+# Extracted text keyed by content hash, so re-uploading a file skips parsing.
+# Set PARSED_CACHE_DIR to keep the cache across restarts.
+parsed_text_cache = ParsedTextCache(
+    max_chars=int(os.environ.get("PARSED_CACHE_MAX_CHARS", "50000000")),
+    directory=os.environ.get("PARSED_CACHE_DIR") or None,
+)
+UPLOAD_READ_SIZE = 1 << 20
+
+# Memory accounting: MEMORY_BUDGET_MB caps corpora, caches and in-flight
+# uploads together (0 = track only). Over budget, caches are trimmed first,
+# then the embedding matrix is spilled to disk; uploads that still don't
+# fit are refused before ingest starts.
+memory = MemoryAccountant(int(float(os.environ.get("MEMORY_BUDGET_MB", "0")) * 2**20))
+memory.register("cache:parsed_text", "cache", parsed_text_cache.memory_bytes, parsed_text_cache.evict, priority=0)
+memory.register("cache:rerank", "cache", reranker.memory_bytes, reranker.evict, priority=0)
+memory.register("corpus:default", "corpus", doc_data.memory_bytes, doc_data.spill, priority=10)
+if sharded_searcher is not None:
+    # a second copy of the float32 matrix, in shared memory
+    memory.register("index:shards", "index", sharded_searcher.memory_bytes)
+
+@app.exception_handler(MemoryBudgetExceeded)
+async def memory_budget_exceeded(request: Request, exc: MemoryBudgetExceeded):
+    status_code = 413 if exc.needed > memory.budget else 503
+    return JSONResponse({"detail": str(exc)}, status_code=status_code)
+
+def upload_size(file: UploadFile) -> int:
+    if file.size is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+def estimate_ingest_bytes(file_size: int) -> int:
+    # text, chunks and metadata each come to about the file size for text
+    # formats, plus an embedding row and its bookkeeping per chunk (chunks
+    # average a bit over half of chunk_text's 1000 char limit)
+    rows = file_size // 500 + 1
+    return 3 * file_size + rows * (doc_data.embedding_dim * 4 + 600)
 
 
 @app.get("/")
 def root():
     return {"message": "The API is running"}
 
-@app.post("/upload")
-async def upload_document(file: UploadFile = File(...)):
+def profiled_parse(path: str, file_ext: str) -> List[str]:
+    # the stage is entered in the worker thread so the sampler follows the parser
+    with stage("parse"):
+        return parse_pages(path, file_ext)
+
+async def read_document_pages(file: UploadFile) -> List[str]:
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
 
     file_ext = os.path.splitext(file.filename)[1].lower()
-    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-        content = await file.read()
-        temp_file.write(content)
+    if file_ext not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+
+    # copy in blocks and hash on the way, the whole upload is never in memory
+    digest = hashlib.sha256()
+    with stage("upload_read"), tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
+        while block := await file.read(UPLOAD_READ_SIZE):
+            digest.update(block)
+            temp_file.write(block)
         temp_path = temp_file.name
 
     try:
-        if file_ext == ".pdf":
-            doc_data.text = extract_text_from_pdf(temp_path)
-        elif file_ext == ".docx":
-            doc_data.text = extract_text_from_docx(temp_path)
-        elif file_ext == ".txt":
-            doc_data.text = extract_text_from_txt(temp_path)
-        else:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-
-        doc_data.chunks = chunk_text(doc_data.text)
-        doc_data.embeddings = embedding_model.encode(doc_data.chunks)
-
-        return {"message": "Document processed successfully", "char_count": len(doc_data.text)}
+        key = content_key(digest.hexdigest(), file_ext)
+        pages = parsed_text_cache.get(key)
+        if pages is None:
+            # pages are kept apart so every chunk knows where it came from
+            try:
+                pages = await asyncio.to_thread(profiled_parse, temp_path, file_ext)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"Could not parse document: {e}")
+            parsed_text_cache.put(key, pages)
+        return pages
     finally:
         os.unlink(temp_path)
 
-def get_relevant_chunks(query: str, top_k: int = 3) -> List[str]:
-    if not doc_data.chunks or doc_data.embeddings is None:
-        return []
+@app.post("/upload")
+async def upload_document(file: UploadFile = File(...)):
+    with memory.reserve(estimate_ingest_bytes(upload_size(file)), "upload"):
+        pages = await read_document_pages(file)
+        document_id = doc_data.add_document(file.filename, pages, chunk_text)
+    admission.record(current_tenant.get(), embedding_calls=1)
+    memory.enforce()
+
+    return {
+        "message": "Document processed successfully",
+        "document_id": document_id,
+        "char_count": len(doc_data.text),
+        "embeddings": doc_data.embeddings.stats(),
+    }
+
+@app.get("/documents")
+def list_documents():
+    return {"documents": doc_data.documents, "embedding_model": doc_data.embedding_model,
+            "embeddings": doc_data.embeddings.stats()}
+
+class EmbeddingModelSwitch(BaseModel):
+    model: str
+
+@app.get("/api/admin/embedding-models")
+def list_embedding_models():
+    return {"models": embedding_models.describe(), "corpus_model": doc_data.embedding_model,
+            "migration": doc_data.migration}
+
+migration_tasks = set()
+
+@app.post("/api/admin/embedding-model")
+async def switch_embedding_model(request: EmbeddingModelSwitch):
+    """Re-embed the corpus with another model in the background, search keeps using the old one until it's done."""
+    if request.model not in embedding_models:
+        raise HTTPException(status_code=404, detail=f"Unknown embedding model: {request.model}")
+    if doc_data.migration and doc_data.migration["state"] == "running":
+        raise HTTPException(status_code=409, detail="An embedding migration is already running")
+    if request.model == doc_data.embedding_model:
+        return {"message": "Corpus already uses this model", "migration": doc_data.migration}
+
+    encode = await asyncio.to_thread(embedding_models.encoder, request.model)
+    dim = embedding_models.dimension(request.model)
+    try:
+        task = doc_data.migrate_embeddings(request.model, encode, dim, MIGRATION_BATCH_SIZE,
+                                           MIGRATION_PAUSE_SECONDS)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    # keep a reference so the task isn't garbage collected mid-run
+    migration_tasks.add(task)
+    task.add_done_callback(migration_tasks.discard)
+    return {"message": "Migration started", "from": doc_data.embedding_model, "to": request.model}
+
+@app.put("/documents/{document_id}")
+async def replace_document(document_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    if document_id not in doc_data.documents:
+        raise HTTPException(status_code=404, detail="Document not found")
+    with memory.reserve(estimate_ingest_bytes(upload_size(file)), "upload"):
+        pages = await read_document_pages(file)
+        try:
+            changes = doc_data.replace_document(document_id, pages, chunk_text)
+            admission.record(current_tenant.get(), embedding_calls=1)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Document not found")
+        except RuntimeError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    memory.enforce()
+
+    background_tasks.add_task(doc_data.maybe_compact, COMPACTION_THRESHOLD)
+    return {"message": "Document replaced", "document_id": document_id, **changes}
+
+@app.delete("/documents/{document_id}")
+def delete_document(document_id: str, background_tasks: BackgroundTasks):
+    try:
+        removed = doc_data.delete_document(document_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Document not found")
 
-    query_embedding = embedding_model.encode(query)
-    similarities = cosine_similarity([query_embedding], doc_data.embeddings)[0]
+    background_tasks.add_task(doc_data.maybe_compact, COMPACTION_THRESHOLD)
+    return {"message": "Document deleted", "document_id": document_id, "removed": removed}
+
+async def get_relevant_chunks(query: str, top_k: int = 3, filters: Optional[dict] = None,
+                              rerank: bool = False, rerank_budget_ms: Optional[float] = None) -> List[str]:
+    if not doc_data.documents:
+        return []
 
-    top_indices = np.argsort(similarities)[-top_k:][::-1]
-    return [doc_data.chunks[i] for i in top_indices]
+    # the filter is resolved first so only the allowed rows get scored
+    admission.record(current_tenant.get(), embedding_calls=1)
+    candidate_count = max(top_k, RERANK_CANDIDATES) if rerank else top_k
+    try:
+        results = doc_data.search_text(query, candidate_count, filters=filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    chunks = [chunk for chunk, _ in results]
+
+    if rerank and len(chunks) > 1:
+        def rerank_candidates():
+            with stage("rerank"):
+                return reranker.rerank(query, chunks, top_k, budget_ms=rerank_budget_ms)
+        # the cross-encoder would block the event loop for the whole budget
+        chunks, _ = await asyncio.to_thread(rerank_candidates)
+    return chunks[:top_k]
+
+def request_filters(request: ChatRequest) -> Optional[dict]:
+    if request.filters is not None:
+        return request.filters
+    latest = doc_data.latest_document_id
+    return {"document_id": latest} if latest else None
+
+async def get_request_chunks(request: ChatRequest) -> List[str]:
+    # the cross-encoder is only loaded when enabled, so callers can't turn it on
+    rerank = RERANK_ENABLED and request.rerank is not False
+    return await get_relevant_chunks(request.messages[-1].content, top_k=request.top_k,
+                                     filters=request_filters(request), rerank=rerank,
+                                     rerank_budget_ms=request.rerank_budget_ms)
+
+
+def record_llm_usage(tenant: str, response) -> None:
+    # prompt/eval counts only come with the final part of a stream
+    admission.record(tenant, tokens_in=response.get("prompt_eval_count"), tokens_out=response.get("eval_count"))
+
+async def stream_llm(model: str, messages):
+    tenant = current_tenant.get()
+    load_duration = None
+    async with llm_scheduler.slot(tenant):
+        keep_alive = residency.begin(model)
+        try:
+            with stage("llm"):
+                async for part in await ollama.chat(model=model, messages=messages, stream=True, keep_alive=keep_alive):
+                    record_llm_usage(tenant, part)
+                    load_duration = part.get("load_duration") or load_duration
+                    yield part
+        finally:
+            residency.end(model, load_duration)
+
+async def call_llm(model: str, messages):
+    tenant = current_tenant.get()
+    async with llm_scheduler.slot(tenant):
+        keep_alive = residency.begin(model)
+        response = None
+        try:
+            with stage("llm"):
+                response = await ollama.chat(model=model, messages=messages, stream=False, keep_alive=keep_alive)
+        finally:
+            residency.end(model, response.get("load_duration") if response is not None else None)
+    record_llm_usage(tenant, response)
+    return response
 
 
-def generate_begin_message(prompt,systemMsg) -> List[dict]:
-    return [
-        {
-            "role": "system",
-            "content": systemMsg
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+# Prompts are built from versioned templates in prompts.py, stats at /api/admin/prompts
+prompts = default_library()
 
+async def document_messages(request: ChatRequest) -> List[dict]:
+    rendered = prompts.render("document_qa", model=request.model, chunks=await get_request_chunks(request),
+                              question=request.messages[-1].content)
+    return rendered.messages
 
+@app.get("/api/admin/prompts")
+def get_prompt_stats():
+    return prompts.stats()
 
 
 async def generate_response_chunks(request: ChatRequest):
-    last_message = request.messages[-1]
-    relevant_chunks = get_relevant_chunks(last_message.content)
-    context = "\n\n".join(relevant_chunks)
-
-    prompt = f"""Document Context:{context} 
-    Based on the above document, answer the following question:
-    {last_message.content}"""
-
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant that answers questions based on the provided document. If the answer isn't in the document, say you don't know."
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+    messages = await document_messages(request)
 
     try:
-        async for part in await ollama.chat(model=request.model, messages=messages, stream=True):
+        async for part in stream_llm(request.model, messages):
             yield json.dumps({'response': part['message']['content']})
     except Exception as e:
         yield json.dumps({'error': str(e)})
 
 @app.post("/chat")
 async def chat_with_document(request: ChatRequest):
+    # reject bad filters before a streaming response has started
+    try:
+        doc_data.metadata.evaluate(request_filters(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await ensure_known_model(request.model)
     if request.streaming:
         print('in streaming','document chat')
         return StreamingResponse(generate_response_chunks(request), media_type="application/json")
     else:
         # Non-streaming response
-        systemMsg = "You are a helpful assistant that answers questions based on the provided document." \
-                    " If the answer isn't in the document, say you don't know."
-        context = "\n\n".join(get_relevant_chunks(request.messages[-1].content))
-
-        prompt = f"""Document Context:{context} 
-                 Based on the above document, answer the following question:
-                 {request.messages[-1].content}"""
-        
-        messages = generate_begin_message(prompt=prompt,systemMsg=systemMsg)
-        response = await ollama.chat(model=request.model, messages=messages, stream=False)
+        messages = await document_messages(request)
+        response = await call_llm(request.model, messages)
         return {"response": response["message"]["content"]}
     
 
@@ -222,26 +539,10 @@ async def chat_with_document(request: ChatRequest):
 # general chat function
 async def generate_general_response_chunks(request: ChatRequest):
     last_message = request.messages[-1]
-   
-    prompt = f"{last_message.content}"
-
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant that answers questions."
-            " Be precise and greet back if the user greets you."
-            "Don't provide wrong information or make up answers."
-            "stick to what user has asked."
-            "provide number of words in the answer at the end of the answer."
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+    messages = prompts.render("general_chat", model=request.model, question=last_message.content).messages
     try:
         # Directly pass the user's messages to the model
-        async for part in await ollama.chat(model=request.model, messages=messages, stream=True):
+        async for part in stream_llm(request.model, messages):
             yield json.dumps({'response': part['message']['content']})
     except Exception as e:
         yield json.dumps({'error': str(e)})
@@ -254,21 +555,26 @@ async def general_chat(request: ChatRequest):
     """
     print('in general chat')
     print(request)
+    await ensure_known_model(request.model)
     if request.streaming:
           return StreamingResponse(generate_general_response_chunks(request), media_type="application/json")
     else:
         # Non-streaming response
-        response = await ollama.chat(model=request.model, messages=request.messages, stream=False)
+        response = await call_llm(request.model, request.messages)
         print(response)
         return {"response": response["message"]["content"]}
 
 @app.get("/models")
 async def get_available_models():
     try:
-        models = await ollama.list()
-        return {"models": models}
+        models = await model_catalog.get()
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    return {"models": {"models": list(models.values())}, "catalog": model_catalog.stats()}
+
+@app.get("/models/residency")
+def get_model_residency():
+    return residency.stats()
 
 # Add this function to process images
 async def process_image(file: UploadFile,request) -> StreamingResponse:
@@ -299,7 +605,7 @@ async def process_image(file: UploadFile,request) -> StreamingResponse:
 
         try:
         # Directly pass the user's messages to the model
-             async for part in await ollama.chat(model=request.model, messages=messages, stream=True):
+             async for part in stream_llm(request.model, messages):
                  yield json.dumps({'response': part['message']['content']})
         except Exception as e:
               yield json.dumps({'error': str(e)})
@@ -321,7 +627,17 @@ async def upload_image(file: UploadFile = File(...),request: ChatRequest = None)
     if file_ext not in [".jpg", ".jpeg", ".png", ".bmp"]:
         raise HTTPException(status_code=400, detail="Unsupported image file type")
     
-    return StreamingResponse(process_image(file,request), media_type="application/json")
+    # hold the decoded image size for as long as the response streams
+    try:
+        with Image.open(file.file) as probe:
+            width, height = probe.size
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+    file.file.seek(0)
+    reservation = ExitStack()
+    reservation.enter_context(memory.reserve(width * height * 4 + upload_size(file), "image"))
+    return StreamingResponse(release_after_body(process_image(file,request), reservation.close),
+                             media_type="application/json")
 
 if __name__ == "__main__":
     uvicorn.run(app, port=8000)
@@ -0,0 +1,52 @@
+import zlib
+from typing import List
+
+
+def _boundary(key: str, weight: float) -> bool:
+    # a cut point chosen by the content alone, with probability `weight`
+    return zlib.crc32(key.encode("utf-8")) < weight * 0xFFFFFFFF
+
+
+def chunk_text(text: str, chunk_size: int = 1000) -> List[str]:
+    """
+    Split text into chunks of at most `chunk_size` characters whose
+    boundaries are picked by the content around them, not by counting from
+    the start of the document. Short lines can only end a chunk at their
+    line break; long lines are cut after words. Either way whether a spot
+    is a boundary depends on its own text, so an edit only changes the
+    chunks next to it and replace_document() re-embeds just those.
+    """
+    target = chunk_size / 2   # mean size the content-defined cuts aim for
+    min_size = chunk_size // 4
+    chunks = []
+    current = []
+    current_length = 0
+
+    def flush():
+        nonlocal current, current_length
+        if current:
+            chunks.append(" ".join(current))
+        current, current_length = [], 0
+
+    for line in text.splitlines():
+        words = line.split()
+        if not words:
+            continue
+        line_length = sum(len(word) + 1 for word in words)
+        long_line = line_length > chunk_size
+        if not long_line and current_length + line_length > chunk_size:
+            flush()  # hard limit, the next content-defined cut resyncs
+        previous = ""
+        for word in words:
+            if current and current_length + len(word) + 1 > chunk_size:
+                flush()
+            current.append(word)
+            current_length += len(word) + 1
+            if long_line and current_length >= min_size and _boundary(previous + " " + word,
+                                                                     (len(word) + 1) / target):
+                flush()
+            previous = word
+        if current_length >= min_size and (long_line or _boundary(line, line_length / target)):
+            flush()
+    flush()
+    return chunks
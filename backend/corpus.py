@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from metadata_index import MetadataIndex
+from profiling import stage
+from sharded_index import ShardedSearcher
+from vector_store import EmbeddingStore, normalize
+
+
+def _chunk_key(page: int, text: str) -> str:
+    return hashlib.sha1(f"{page}\0{text}".encode("utf-8")).hexdigest()
+
+
+class DocumentData:
+    """
+    The document corpus: chunk text, chunk metadata and embeddings, all
+    addressed by the same row number. Replacing or deleting a document
+    tombstones its rows, compact() rewrites everything without them.
+    The corpus records which embedding model produced its vectors;
+    migrate_embeddings() moves it to another one in the background.
+    """
+
+    def __init__(self, encode: Callable, storage_mode: str = "float32", rescore_factor: int = 4,
+                 sharded: Optional[ShardedSearcher] = None, shard_min_rows: int = 50000,
+                 embedding_model: str = "", embedding_dim: int = 0):
+        self.encode = encode
+        self.embedding_model = embedding_model
+        self.embedding_dim = embedding_dim
+        self.migration = None  # status of the running or last re-embedding
+        self._migration_store = None
+        self.storage_mode = storage_mode
+        self.rescore_factor = rescore_factor
+        self.text = ""  # text of the last uploaded document
+        self.chunks = []
+        self.embeddings = EmbeddingStore(storage_mode, rescore_factor=rescore_factor)
+        self.metadata = MetadataIndex()  # one entry per chunk
+        self.documents = {}  # document_id -> document info
+        self.sharded = sharded  # scatter-gather search for large float32 corpora
+        self.shard_min_rows = shard_min_rows
+        self.version = 0  # bumped by every change, compaction checks it before swapping
+        self._size_cache = None
+        self._lock = threading.RLock()
+
+    def _append_rows(self, chunks: List[str], metadata: List[dict], vectors) -> None:
+        self.embeddings.append(vectors)
+        self.chunks.extend(chunks)
+        self.metadata.add(metadata)
+
+    def _live_rows(self, document_id: str) -> List[int]:
+        rows = self.metadata.posting("document_id", document_id)
+        return [row for row in rows if self.embeddings.live[row]]
+
+    def _encode_current(self, texts: List[str]):
+        encode, model = self.encode, self.embedding_model
+        with stage("embed"):
+            return (encode(texts) if texts else []), model
+
+    def add_document(self, filename: str, pages: List[str], chunker: Callable) -> str:
+        document_id = uuid.uuid4().hex
+        uploaded_at = datetime.now(timezone.utc).isoformat()
+        chunks, metadata = [], []
+        file_type = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+        for page_number, page_text in enumerate(pages, start=1):
+            for chunk in chunker(page_text):
+                chunks.append(chunk)
+                metadata.append({
+                    "document_id": document_id,
+                    "filename": filename,
+                    "file_type": file_type,
+                    "page": page_number,
+                    "uploaded_at": uploaded_at,
+                })
+
+        vectors, model = self._encode_current(chunks)
+        with self._lock, stage("index"):
+            if model != self.embedding_model:
+                # a migration switched models while we were encoding
+                vectors = self.encode(chunks) if chunks else []
+            self._append_rows(chunks, metadata, vectors)
+            self.text = "".join(pages)
+            self.documents[document_id] = {
+                "filename": filename,
+                "file_type": file_type,
+                "pages": len(pages),
+                "chunks": len(chunks),
+                "uploaded_at": uploaded_at,
+                "updated_at": uploaded_at,
+            }
+            self.version += 1
+        return document_id
+
+    def replace_document(self, document_id: str, pages: List[str], chunker: Callable) -> dict:
+        """
+        Diff the new chunk list against the live rows of the document. Rows
+        whose (page, text) is unchanged stay as they are, only new chunks
+        are embedded and only removed chunks are tombstoned.
+        """
+        with self._lock:
+            if document_id not in self.documents:
+                raise KeyError(document_id)
+            info = self.documents[document_id]
+            old_rows = {}
+            for row in self._live_rows(document_id):
+                meta = self.metadata.rows[row]
+                old_rows.setdefault(_chunk_key(meta["page"], self.chunks[row]), []).append(row)
+            version = self.version
+
+        kept, new_chunks, new_metadata = 0, [], []
+        updated_at = datetime.now(timezone.utc).isoformat()
+        for page_number, page_text in enumerate(pages, start=1):
+            for chunk in chunker(page_text):
+                matches = old_rows.get(_chunk_key(page_number, chunk))
+                if matches:
+                    matches.pop()
+                    kept += 1
+                    continue
+                new_chunks.append(chunk)
+                new_metadata.append({
+                    "document_id": document_id,
+                    "filename": info["filename"],
+                    "file_type": info["file_type"],
+                    "page": page_number,
+                    "uploaded_at": updated_at,
+                })
+        removed = [row for rows in old_rows.values() for row in rows]
+
+        vectors, _ = self._encode_current(new_chunks)
+        with self._lock, stage("index"):
+            if self.version != version:
+                raise RuntimeError("Document changed during replace, try again")
+            self.embeddings.delete(removed)
+            self._append_rows(new_chunks, new_metadata, vectors)
+            self.text = "".join(pages)
+            info.update({
+                "pages": len(pages),
+                "chunks": kept + len(new_chunks),
+                "updated_at": updated_at,
+            })
+            self.version += 1
+        return {"kept": kept, "embedded": len(new_chunks), "removed": len(removed)}
+
+    @property
+    def latest_document_id(self) -> Optional[str]:
+        # documents keep upload order, replacing one keeps its place
+        return next(reversed(self.documents), None)
+
+    def delete_document(self, document_id: str) -> int:
+        with self._lock:
+            if document_id not in self.documents:
+                raise KeyError(document_id)
+            rows = self._live_rows(document_id)
+            self.embeddings.delete(rows)
+            del self.documents[document_id]
+            self.version += 1
+        return len(rows)
+
+    def search_text(self, query: str, top_k: int, filters: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """Encode the query with the corpus's current model and search."""
+        vectors, model = self._encode_current([query])
+        with self._lock:
+            if model != self.embedding_model:
+                vectors = self.encode([query])
+            with stage("search"):
+                return self.search(vectors[0], top_k, filters=filters)
+
+    def search(self, query_embedding, top_k: int, filters: Optional[dict] = None) -> List[Tuple[str, float]]:
+        with self._lock:
+            mask = self.metadata.evaluate(filters)
+            candidates = None if mask is None else np.flatnonzero(mask)
+            store = self.embeddings
+            if self.sharded is not None and store.mode == "float32" and store.count >= self.shard_min_rows:
+                # only rows appended since the last query are copied
+                self.sharded.sync(store.compact, token=store.id)
+                candidates = store.live_candidates(candidates)
+                results = self.sharded.search(normalize(query_embedding), top_k, candidates=candidates)
+            else:
+                results = store.search(query_embedding, top_k, candidates=candidates)
+            return [(self.chunks[row], score) for row, score in results]
+
+    def compact(self) -> bool:
+        """
+        Rewrite chunks, metadata and embeddings without tombstoned rows. The
+        new structures are built outside the lock and swapped in only if
+        nothing changed meanwhile.
+        """
+        with self._lock:
+            # row numbers must stay put while a migration copies them
+            if not self.embeddings.deleted or self._migration_store is not None:
+                return False
+            version = self.version
+            store, chunks, metadata = self.embeddings, self.chunks, self.metadata
+            keep = np.flatnonzero(store.live)
+
+        new_store = store.rewritten(keep)
+        new_chunks = [chunks[row] for row in keep]
+        new_metadata = MetadataIndex()
+        new_metadata.add([metadata.rows[row] for row in keep])
+
+        with self._lock:
+            if self.version != version or self._migration_store is not None:
+                return False
+            self.embeddings, self.chunks, self.metadata = new_store, new_chunks, new_metadata
+            self.version += 1
+        store.close()
+        return True
+
+    def memory_bytes(self) -> dict:
+        """Approximate bytes held per part, recomputed only after a change."""
+        store = self.embeddings
+        migrating = self._migration_store.count if self._migration_store is not None else None
+        token = (self.version, store.spilled, store.count, migrating)
+        if self._size_cache is None or self._size_cache[0] != token:
+            rows = self.metadata.rows
+            row_bytes = sys.getsizeof(rows[0]) + 8 * len(rows[0]) if rows else 0
+            sizes = {
+                "text": sys.getsizeof(self.text),
+                "chunks": sum(sys.getsizeof(chunk) for chunk in self.chunks),
+                # the dict per row plus one posting list slot per field
+                "metadata": len(rows) * row_bytes,
+                "embeddings": store.memory_bytes() + store.live.nbytes,
+            }
+            if self._migration_store is not None:
+                sizes["migration"] = self._migration_store.memory_bytes()
+            self._size_cache = (token, sizes)
+        return self._size_cache[1]
+
+    def spill(self, nbytes: int) -> int:
+        """Free memory by moving the embedding matrix to disk."""
+        with self._lock:
+            return self.embeddings.spill()
+
+    def maybe_compact(self, threshold: float) -> bool:
+        if self.embeddings.tombstone_ratio() < threshold:
+            return False
+        return self.compact()
+
+    def migrate_embeddings(self, model_name: str, encode: Callable, dim: int,
+                           batch_size: int = 64, pause: float = 0.05) -> asyncio.Task:
+        """
+        Re-embed every row with another model. Batches are encoded in a worker
+        thread with a pause in between, so the old index keeps serving at
+        close to full speed. Rows added meanwhile are caught up, then the
+        new index and encoder are swapped in together. Must be called from
+        the event loop; returns the background task.
+        """
+        with self._lock:
+            if self._migration_store is not None:
+                raise RuntimeError("An embedding migration is already running")
+            store = EmbeddingStore(self.storage_mode, rescore_factor=self.rescore_factor)
+            self._migration_store = store
+            self.migration = {"from": self.embedding_model, "to": model_name, "state": "running",
+                              "done": 0, "total": len(self.chunks), "started_at": time.time()}
+        return asyncio.create_task(self._migrate(store, model_name, encode, dim, batch_size, pause))
+
+    async def _migrate(self, store: EmbeddingStore, model_name: str, encode: Callable, dim: int,
+                       batch_size: int, pause: float) -> None:
+        try:
+            # compaction is paused, so row numbers and self.chunks stay stable
+            while True:
+                with self._lock:
+                    start, total = store.count, len(self.chunks)
+                self.migration["total"] = total
+                if total - start <= batch_size:
+                    break
+                batch = self.chunks[start:min(total, start + batch_size)]
+                store.append(await asyncio.to_thread(encode, batch))
+                self.migration["done"] = store.count
+                await asyncio.sleep(pause)
+
+            with self._lock:
+                remaining = self.chunks[store.count:]
+                if remaining:
+                    store.append(encode(remaining))
+                old = self.embeddings
+                store.delete(np.flatnonzero(~old.live))
+                self.embeddings = store
+                self.encode = encode
+                self.embedding_model = model_name
+                self.embedding_dim = dim
+                self.version += 1
+            old.close()
+            self.migration.update(state="done", done=store.count, total=store.count, finished_at=time.time())
+        except Exception as e:
+            store.close()
+            # the old index is untouched, so the corpus keeps working as before
+            self.migration.update(state="failed", error=str(e), finished_at=time.time())
+        finally:
+            self._migration_store = None
@@ -0,0 +1,55 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Models a corpus can be embedded with. The smaller ones trade some
+# retrieval quality for faster encoding at upload and query time.
+DEFAULT_MODELS = {
+    "all-MiniLM-L6-v2": {"dim": 384, "notes": "default, balanced"},
+    "paraphrase-MiniLM-L3-v2": {"dim": 384, "notes": "3 layers, about twice as fast as L6"},
+    "multi-qa-MiniLM-L6-cos-v1": {"dim": 384, "notes": "tuned for question answering"},
+    "all-mpnet-base-v2": {"dim": 768, "notes": "slower, most accurate"},
+}
+
+
+class EmbeddingModelRegistry:
+    """
+    Known sentence-transformer models, loaded on first use and shared by
+    every corpus that uses them.
+    """
+
+    def __init__(self, models: Optional[Dict[str, dict]] = None, loader: Optional[Callable] = None):
+        self.models = dict(models or DEFAULT_MODELS)
+        self.loader = loader
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, dim: Optional[int] = None, notes: str = "") -> None:
+        self.models[name] = {"dim": dim, "notes": notes}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.models
+
+    def get(self, name: str):
+        if name not in self.models:
+            raise KeyError(f"Unknown embedding model: {name}")
+        # migrations load models from worker threads
+        with self._lock:
+            if name not in self._loaded:
+                loader = self.loader
+                if loader is None:
+                    from sentence_transformers import SentenceTransformer as loader
+                model = loader(name)
+                self.models[name]["dim"] = model.get_sentence_embedding_dimension()
+                self._loaded[name] = model
+            return self._loaded[name]
+
+    def encoder(self, name: str) -> Callable:
+        return self.get(name).encode
+
+    def dimension(self, name: str) -> int:
+        if self.models[name].get("dim") is None:
+            self.get(name)
+        return self.models[name]["dim"]
+
+    def describe(self) -> List[dict]:
+        return [dict(info, name=name, loaded=name in self._loaded) for name, info in self.models.items()]
@@ -0,0 +1,117 @@
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Union
+
+Size = Union[int, Dict[str, int]]
+
+
+class MemoryBudgetExceeded(Exception):
+    def __init__(self, needed: int, available: int):
+        super().__init__(f"Needs {needed} bytes, only {available} available in the memory budget")
+        self.needed = needed
+        self.available = available
+
+
+class _Consumer:
+    def __init__(self, name: str, kind: str, size: Callable[[], Size], evict: Optional[Callable[[int], int]],
+                 priority: int):
+        self.name = name
+        self.kind = kind
+        self.size = size
+        self.evict = evict
+        self.priority = priority
+
+
+def _total(size: Size) -> int:
+    return sum(size.values()) if isinstance(size, dict) else int(size)
+
+
+class MemoryAccountant:
+    """
+    Attributes memory to corpora, caches and in-flight uploads.
+
+    Every consumer registers a size callback (bytes, or a dict of parts) and
+    optionally an evict callback that tries to free the requested number of
+    bytes (dropping cache entries, spilling to disk) and returns how many it
+    freed. When the budget is crossed consumers are asked in priority order,
+    lowest first. A budget of 0 only tracks and never evicts.
+    """
+
+    def __init__(self, budget: int = 0):
+        self.budget = budget
+        self._consumers: Dict[str, _Consumer] = {}
+        self._reservations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.evicted_bytes = 0
+        self.refused = 0
+
+    def register(self, name: str, kind: str, size: Callable[[], Size],
+                 evict: Optional[Callable[[int], int]] = None, priority: int = 0) -> None:
+        self._consumers[name] = _Consumer(name, kind, size, evict, priority)
+
+    def unregister(self, name: str) -> None:
+        self._consumers.pop(name, None)
+
+    def used(self) -> int:
+        consumers = sum(_total(consumer.size()) for consumer in list(self._consumers.values()))
+        return consumers + sum(self._reservations.values())
+
+    def available(self) -> Optional[int]:
+        if not self.budget:
+            return None
+        return self.budget - self.used()
+
+    def enforce(self, extra: int = 0) -> bool:
+        """Evict until `extra` more bytes fit in the budget, return whether they do."""
+        if not self.budget:
+            return True
+        over = self.used() + extra - self.budget
+        for consumer in sorted(self._consumers.values(), key=lambda c: c.priority):
+            if over <= 0:
+                break
+            if consumer.evict is None:
+                continue
+            freed = consumer.evict(over)
+            self.evicted_bytes += freed
+            over -= freed
+        return over <= 0
+
+    @contextmanager
+    def reserve(self, nbytes: int, label: str = "upload"):
+        """
+        Hold `nbytes` for work in progress, e.g. an upload being ingested.
+        Raises MemoryBudgetExceeded up front when it can't fit even after
+        eviction, so the work is refused before it starts.
+        """
+        name = f"{label}:{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            if self.budget and (nbytes > self.budget or not self.enforce(nbytes)):
+                self.refused += 1
+                raise MemoryBudgetExceeded(nbytes, max(0, self.budget - self.used()))
+            self._reservations[name] = nbytes
+        try:
+            yield name
+        finally:
+            with self._lock:
+                self._reservations.pop(name, None)
+
+    def breakdown(self) -> dict:
+        consumers = []
+        for consumer in self._consumers.values():
+            size = consumer.size()
+            entry = {"name": consumer.name, "kind": consumer.kind, "bytes": _total(size)}
+            if isinstance(size, dict):
+                entry["parts"] = size
+            consumers.append(entry)
+        for name, nbytes in self._reservations.items():
+            consumers.append({"name": name, "kind": "in_flight", "bytes": nbytes})
+        used = sum(entry["bytes"] for entry in consumers)
+        return {
+            "budget": self.budget,
+            "used": used,
+            "available": self.budget - used if self.budget else None,
+            "evicted_bytes": self.evicted_bytes,
+            "refused": self.refused,
+            "consumers": sorted(consumers, key=lambda entry: -entry["bytes"]),
+        }
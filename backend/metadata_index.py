@@ -0,0 +1,122 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Fields a chunk filter can use. Keyword fields match exact values through
+# posting lists, range fields are answered from a sorted value column.
+KEYWORD_FIELDS = ("document_id", "filename", "file_type")
+RANGE_FIELDS = ("page", "uploaded_at")
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte")
+_SCALARS = (str, int, float)
+
+
+def _to_number(value) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid number: {value}")
+
+
+def _to_timestamp(value) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+
+
+class MetadataIndex:
+    """
+    Per-chunk metadata with precomputed posting lists, so a filter resolves
+    to the set of allowed rows before any vector is scored.
+
+    Filters are a dict of field -> condition, all conditions must hold:
+        {"document_id": "3f2a..."}                 exact match
+        {"file_type": ["pdf", "docx"]}             any of
+        {"page": {"gte": 2, "lte": 5}}             range
+        {"uploaded_at": {"gte": "2025-01-01"}}     range, ISO date or epoch
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.rows: List[dict] = []
+        self._postings: Dict[str, Dict[str, List[int]]] = {field: {} for field in KEYWORD_FIELDS}
+        self._columns: Dict[str, List[float]] = {field: [] for field in RANGE_FIELDS}
+        self._sorted: Dict[str, tuple] = {}  # field -> (sorted values, rows), rebuilt lazily
+
+    def add(self, metadata: List[dict]) -> None:
+        for meta in metadata:
+            row = self.count
+            for field in KEYWORD_FIELDS:
+                self._postings[field].setdefault(str(meta.get(field)), []).append(row)
+            self._columns["page"].append(float(meta.get("page", 0)))
+            self._columns["uploaded_at"].append(_to_timestamp(meta.get("uploaded_at", 0)))
+            self.rows.append(meta)
+            self.count += 1
+        self._sorted.clear()
+
+    def posting(self, field: str, value) -> List[int]:
+        return list(self._postings[field].get(str(value), []))
+
+    def _sorted_column(self, field: str):
+        if field not in self._sorted:
+            values = np.asarray(self._columns[field], dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            self._sorted[field] = (values[order], order)
+        return self._sorted[field]
+
+    def _keyword_bitmap(self, field: str, condition) -> np.ndarray:
+        values = condition if isinstance(condition, list) else [condition]
+        if not all(isinstance(value, _SCALARS) for value in values):
+            raise ValueError(f"{field} must be a value or a list of values")
+        bitmap = np.zeros(self.count, dtype=bool)
+        for value in values:
+            bitmap[self._postings[field].get(str(value), [])] = True
+        return bitmap
+
+    def _range_bitmap(self, field: str, condition) -> np.ndarray:
+        if isinstance(condition, list):
+            raise ValueError(f"{field} takes a value or a range like {{\"gte\": ..., \"lte\": ...}}, not a list")
+        if not isinstance(condition, dict):
+            condition = {"gte": condition, "lte": condition}
+        unknown = set(condition) - set(RANGE_OPERATORS)
+        if unknown:
+            raise ValueError(f"Unknown operators for {field}: {sorted(unknown)}")
+        for operator, value in condition.items():
+            if isinstance(value, bool) or not isinstance(value, _SCALARS):
+                raise ValueError(f"{field} {operator} must be a number or a date, not {type(value).__name__}")
+
+        convert = _to_timestamp if field == "uploaded_at" else _to_number
+        values, order = self._sorted_column(field)
+        start, end = 0, len(values)
+        if "gte" in condition:
+            start = max(start, np.searchsorted(values, convert(condition["gte"]), side="left"))
+        if "gt" in condition:
+            start = max(start, np.searchsorted(values, convert(condition["gt"]), side="right"))
+        if "lte" in condition:
+            end = min(end, np.searchsorted(values, convert(condition["lte"]), side="right"))
+        if "lt" in condition:
+            end = min(end, np.searchsorted(values, convert(condition["lt"]), side="left"))
+
+        bitmap = np.zeros(self.count, dtype=bool)
+        if start < end:
+            bitmap[order[start:end]] = True
+        return bitmap
+
+    def evaluate(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Return a boolean mask of matching rows, or None when unfiltered."""
+        if not filters:
+            return None
+        if not isinstance(filters, dict):
+            raise ValueError("Filters must be an object of field conditions")
+        mask = np.ones(self.count, dtype=bool)
+        for field, condition in filters.items():
+            if field in KEYWORD_FIELDS:
+                mask &= self._keyword_bitmap(field, condition)
+            elif field in RANGE_FIELDS:
+                mask &= self._range_bitmap(field, condition)
+            else:
+                raise ValueError(f"Unknown filter field: {field}")
+        return mask
@@ -0,0 +1,141 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+
+def ollama_field(obj, name, default=None):
+    # ollama returns pydantic models in newer clients and dicts in older ones
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def _context_length(show_response) -> Optional[int]:
+    model_info = ollama_field(show_response, "modelinfo") or ollama_field(show_response, "model_info") or {}
+    for key, value in dict(model_info).items():
+        if key.endswith(".context_length"):
+            return int(value)
+    return None
+
+
+class ModelCatalog:
+    """
+    Cached list of the models Ollama can serve. Reads are answered from the
+    cache; once an entry is older than `ttl` it is still returned while a
+    background refresh fetches a new one (stale-while-revalidate). A failed
+    refresh keeps the previous list.
+    """
+
+    def __init__(self, client, ttl: float = 60.0, refresh_interval: Optional[float] = None,
+                 miss_refresh_after: float = 5.0):
+        self.client = client
+        self.ttl = ttl
+        self.miss_refresh_after = miss_refresh_after
+        self.refresh_interval = refresh_interval or ttl
+        self.models: Dict[str, dict] = {}
+        self.updated_at = 0.0
+        self.last_error: Optional[str] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.updated_at > 0
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.updated_at > self.ttl
+
+    async def _describe(self, model) -> dict:
+        name = ollama_field(model, "model") or ollama_field(model, "name")
+        details = ollama_field(model, "details") or {}
+        entry = {
+            "model": name,
+            "size": ollama_field(model, "size"),
+            "modified_at": str(ollama_field(model, "modified_at") or ""),
+            "family": ollama_field(details, "family"),
+            "parameter_size": ollama_field(details, "parameter_size"),
+            "quantization": ollama_field(details, "quantization_level"),
+            "format": ollama_field(details, "format"),
+            "context_length": None,
+        }
+        try:
+            entry["context_length"] = _context_length(await self.client.show(name))
+        except Exception:
+            pass  # details are best effort, the model is still usable
+        return entry
+
+    async def refresh(self) -> None:
+        try:
+            listing = await self.client.list()
+            models = ollama_field(listing, "models") or []
+            entries = await asyncio.gather(*[self._describe(model) for model in models])
+        except Exception as e:
+            self.last_error = str(e)
+            raise
+        self.models = {entry["model"]: entry for entry in entries}
+        self.updated_at = time.monotonic()
+        self.last_error = None
+
+    def _refresh_in_background(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._quiet_refresh())
+
+    async def _quiet_refresh(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            pass  # last_error is set, readers keep the stale list
+
+    async def get(self) -> Dict[str, dict]:
+        if not self.loaded:
+            if self._refresh_task is not None and not self._refresh_task.done():
+                await self._refresh_task
+            if not self.loaded:
+                await self.refresh()
+        elif self.is_stale():
+            self._refresh_in_background()
+        return self.models
+
+    async def contains(self, model: str) -> Optional[bool]:
+        """True/False when the catalog knows, None when Ollama was never reachable."""
+        try:
+            models = await self.get()
+        except Exception:
+            return None
+        if self._known(model, models):
+            return True
+        # the model may have been pulled since the last refresh, recheck
+        # once, but not more often than every `miss_refresh_after` seconds
+        if time.monotonic() - self.updated_at > self.miss_refresh_after:
+            try:
+                await self.refresh()
+            except Exception:
+                return None
+        return self._known(model, self.models)
+
+    @staticmethod
+    def _known(model: str, models: Dict[str, dict]) -> bool:
+        # "gemma3" means "gemma3:latest" to Ollama
+        return model in models or (":" not in model and f"{model}:latest" in models)
+
+    def start(self) -> None:
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await self._quiet_refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def stop(self) -> None:
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            self._loop_task = None
+
+    def stats(self) -> dict:
+        return {
+            "models": len(self.models),
+            "age_seconds": round(time.monotonic() - self.updated_at, 1) if self.loaded else None,
+            "stale": self.is_stale() if self.loaded else None,
+            "last_error": self.last_error,
+        }
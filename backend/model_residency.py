@@ -0,0 +1,188 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from model_catalog import ollama_field
+
+
+def canonical_model(model: str) -> str:
+    # Ollama reports "gemma3" as "gemma3:latest"
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaResidencyBackend:
+    """Loads and unloads models through the Ollama API."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def load(self, model: str, keep_alive: str) -> None:
+        # an empty prompt loads the model without generating anything
+        await self.client.generate(model=model, prompt="", keep_alive=keep_alive)
+
+    async def unload(self, model: str) -> None:
+        await self.client.generate(model=model, prompt="", keep_alive=0)
+
+    async def loaded(self) -> Dict[str, int]:
+        """Resident models and the memory they hold."""
+        response = await self.client.ps()
+        resident = {}
+        for model in ollama_field(response, "models") or []:
+            name = ollama_field(model, "model") or ollama_field(model, "name")
+            resident[name] = ollama_field(model, "size_vram") or ollama_field(model, "size") or 0
+        return resident
+
+
+class ResidencyManager:
+    """
+    Keeps the models people actually use loaded in Ollama.
+
+    Request rates are tracked per model over a sliding window. Hot models
+    get a long keep_alive on every request and are loaded ahead of time,
+    cold ones a short keep_alive. When the resident set is over the memory
+    budget the coldest idle models are unloaded first.
+    """
+
+    def __init__(self, backend, memory_budget: int = 0, preload: Optional[List[str]] = None,
+                 size_of: Optional[Callable[[str], Optional[int]]] = None, window: float = 600.0,
+                 hot_rate: float = 1.0, warm_rate: float = 0.1, keep_alive_hot: str = "30m",
+                 keep_alive_warm: str = "5m", keep_alive_cold: str = "1m", cold_start_seconds: float = 1.0):
+        self.backend = backend
+        self.memory_budget = memory_budget  # bytes, 0 means no limit
+        self.preload_models = [canonical_model(model) for model in preload or []]
+        self.size_of = size_of or (lambda model: None)
+        self.window = window
+        self.hot_rate = hot_rate      # requests per minute
+        self.warm_rate = warm_rate
+        self.keep_alive_hot = keep_alive_hot
+        self.keep_alive_warm = keep_alive_warm
+        self.keep_alive_cold = keep_alive_cold
+        self.cold_start_seconds = cold_start_seconds
+        self.resident: Dict[str, int] = {}
+        self._requests: Dict[str, deque] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._stats: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _model_stats(self, model: str) -> dict:
+        if model not in self._stats:
+            self._stats[model] = {"requests": 0, "cold_starts": 0, "load_seconds_total": 0.0,
+                                  "load_seconds_max": 0.0, "preloads": 0, "unloads": 0}
+        return self._stats[model]
+
+    def rate(self, model: str, now: Optional[float] = None) -> float:
+        """Requests per minute over the window."""
+        now = time.monotonic() if now is None else now
+        timestamps = self._requests.get(model)
+        if not timestamps:
+            return 0.0
+        while timestamps and now - timestamps[0] > self.window:
+            timestamps.popleft()
+        return len(timestamps) * 60.0 / self.window
+
+    def keep_alive_for(self, model: str) -> str:
+        model = canonical_model(model)
+        rate = self.rate(model)
+        if rate >= self.hot_rate:
+            return self.keep_alive_hot
+        if rate >= self.warm_rate or model in self.preload_models:
+            return self.keep_alive_warm
+        return self.keep_alive_cold
+
+    def begin(self, model: str) -> str:
+        """Note a request for `model` and return the keep_alive to send with it."""
+        model = canonical_model(model)
+        self._requests.setdefault(model, deque()).append(time.monotonic())
+        self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        self._model_stats(model)["requests"] += 1
+        return self.keep_alive_for(model)
+
+    def end(self, model: str, load_duration_ns: Optional[int] = None) -> None:
+        """Record the outcome, Ollama reports how long loading the model took."""
+        model = canonical_model(model)
+        self._in_flight[model] = max(0, self._in_flight.get(model, 0) - 1)
+        load_seconds = (load_duration_ns or 0) / 1e9
+        if load_seconds >= self.cold_start_seconds:
+            stats = self._model_stats(model)
+            stats["cold_starts"] += 1
+            stats["load_seconds_total"] += load_seconds
+            stats["load_seconds_max"] = max(stats["load_seconds_max"], load_seconds)
+        self.resident.setdefault(model, self.size_of(model) or 0)
+
+    def _fits(self, extra: int) -> bool:
+        if not self.memory_budget:
+            return True
+        return sum(self.resident.values()) + extra <= self.memory_budget
+
+    async def _load(self, model: str) -> None:
+        started = time.perf_counter()
+        await self.backend.load(model, self.keep_alive_for(model))
+        elapsed = time.perf_counter() - started
+        stats = self._model_stats(model)
+        stats["preloads"] += 1
+        stats["load_seconds_total"] += elapsed
+        stats["load_seconds_max"] = max(stats["load_seconds_max"], elapsed)
+        self.resident[model] = self.size_of(model) or 0
+
+    async def preload(self) -> None:
+        for model in self.preload_models:
+            if model not in self.resident and self._fits(self.size_of(model) or 0):
+                try:
+                    await self._load(model)
+                except Exception:
+                    pass  # a missing model shouldn't stop startup
+
+    async def rebalance(self) -> None:
+        """Sync the resident set, unload cold models over budget and load hot ones."""
+        self.resident = await self.backend.loaded()
+
+        if self.memory_budget:
+            idle = [m for m in self.resident if not self._in_flight.get(m)]
+            for model in sorted(idle, key=self.rate):
+                if self._fits(0):
+                    break
+                await self.backend.unload(model)
+                self._model_stats(model)["unloads"] += 1
+                del self.resident[model]
+
+        hot = [m for m in self._requests if self.rate(m) >= self.hot_rate and m not in self.resident]
+        for model in sorted(hot, key=self.rate, reverse=True):
+            if self._fits(self.size_of(model) or 0):
+                await self._load(model)
+
+    def start(self, interval: float = 30.0) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def _run(self, interval: float) -> None:
+        await self.preload()
+        while True:
+            try:
+                await self.rebalance()
+            except Exception:
+                pass  # Ollama busy or down, try again next round
+            await asyncio.sleep(interval)
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        models = {}
+        for model, stats in self._stats.items():
+            cold_starts = stats["cold_starts"]
+            models[model] = dict(
+                stats,
+                rate_per_minute=round(self.rate(model), 3),
+                keep_alive=self.keep_alive_for(model),
+                resident=model in self.resident,
+                load_seconds_avg=round(stats["load_seconds_total"] / max(1, cold_starts + stats["preloads"]), 3),
+            )
+        return {
+            "memory_budget": self.memory_budget,
+            "resident_bytes": sum(self.resident.values()),
+            "resident": list(self.resident),
+            "models": models,
+        }
@@ -0,0 +1,257 @@
+import codecs
+import json
+import os
+import zipfile
+from collections import OrderedDict
+from typing import BinaryIO, List, Optional, Union
+from xml.etree import ElementTree
+
+from PyPDF2 import PdfReader
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:  # optional, BOM and utf-8 checks still work without it
+    detect_charset = None
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+PARSER_VERSION = 2  # part of the cache key, bump when extraction output changes
+
+_READ_SIZE = 1 << 20
+_SNIFF_SIZE = 64 * 1024
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+Source = Union[str, BinaryIO]
+
+
+def extract_pages_from_pdf(source: Source) -> List[str]:
+    reader = PdfReader(source)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def extract_text_from_pdf(source: Source) -> str:
+    return "".join(extract_pages_from_pdf(source))
+
+
+def extract_text_from_docx(source: Source) -> str:
+    """
+    Stream word/document.xml with iterparse instead of building the whole
+    python-docx object model. Paragraphs become lines and table rows become
+    "cell | cell" lines; elements are cleared once read so memory stays flat.
+    A text box paragraph becomes its own line ahead of the paragraph holding
+    the box, and the legacy copy Word saves in mc:Fallback is skipped.
+    """
+    lines = []
+    parts = []         # text runs of the current paragraph
+    paragraph_stack = []  # (parts, run_depth) of paragraphs a text box is nested in
+    cell_stack = []    # paragraphs of each open table cell
+    row_stack = []     # cells of each open table row
+    run_depth = 0      # w:tab also defines tab stops in w:pPr, only runs hold content
+    fallback_depth = 0  # inside mc:Fallback, a duplicate of the mc:Choice content
+
+    def emit(text):
+        if cell_stack:
+            cell_stack[-1].append(text)
+        else:
+            lines.append(text)
+
+    with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as xml:
+        for event, elem in ElementTree.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            if tag == _MC + "Fallback":
+                fallback_depth += 1 if event == "start" else -1
+                if event == "end":
+                    elem.clear()
+                continue
+            if fallback_depth:
+                continue
+
+            if event == "start":
+                if tag == _W + "r":
+                    run_depth += 1
+                elif tag == _W + "p":
+                    paragraph_stack.append((parts, run_depth))
+                    parts, run_depth = [], 0
+                elif tag == _W + "tc":
+                    cell_stack.append([])
+                elif tag == _W + "tr":
+                    row_stack.append([])
+                continue
+
+            if tag == _W + "r":
+                run_depth -= 1
+            elif tag == _W + "t":
+                parts.append(elem.text or "")
+            elif run_depth and tag == _W + "tab":
+                parts.append("\t")
+            elif run_depth and tag in (_W + "br", _W + "cr"):
+                parts.append("\n")
+            elif tag == _W + "p":
+                emit("".join(parts))
+                parts, run_depth = paragraph_stack.pop()
+                elem.clear()
+            elif tag == _W + "tc":
+                paragraphs = cell_stack.pop()
+                row_stack[-1].append(" ".join(p for p in paragraphs if p))
+            elif tag == _W + "tr":
+                emit(" | ".join(row_stack.pop()))
+                elem.clear()
+            elif tag == _W + "tbl":
+                elem.clear()
+    return "\n".join(lines)
+
+
+def _guess_wide_encoding(sample: bytes) -> Optional[str]:
+    """UTF-16/32 without a BOM, told apart by where the NUL bytes of ASCII text fall."""
+    def mostly_zero(offset, step):
+        column = sample[offset::step]
+        return len(column) > 0 and column.count(0) >= 0.7 * len(column)
+
+    if len(sample) >= 8:
+        if mostly_zero(1, 4) and mostly_zero(2, 4) and mostly_zero(3, 4):
+            return "utf-32-le"
+        if mostly_zero(0, 4) and mostly_zero(1, 4) and mostly_zero(2, 4):
+            return "utf-32-be"
+    if len(sample) >= 2:
+        if mostly_zero(1, 2) and not mostly_zero(0, 2):
+            return "utf-16-le"
+        if mostly_zero(0, 2) and not mostly_zero(1, 2):
+            return "utf-16-be"
+    return None
+
+
+def detect_encoding(sample: bytes) -> str:
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        # NUL is valid UTF-8 but never shows up in real text files
+        wide = _guess_wide_encoding(sample)
+        if wide is not None:
+            return wide
+    try:
+        # final=False so a character cut off at the end of the sample is fine
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        if sample.count(0) <= len(sample) // 100:
+            return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if detect_charset is not None:
+        match = detect_charset(sample).best()
+        if match is not None:
+            return match.encoding
+    return "cp1252"
+
+
+def extract_text_from_txt(source: Source) -> str:
+    """Decode incrementally in fixed-size reads, guessing the encoding from the first block."""
+    f = open(source, "rb") if isinstance(source, str) else source
+    try:
+        first = f.read(_SNIFF_SIZE)
+        decoder = codecs.getincrementaldecoder(detect_encoding(first))(errors="replace")
+        parts = [decoder.decode(first)]
+        while True:
+            block = f.read(_READ_SIZE)
+            if not block:
+                break
+            parts.append(decoder.decode(block))
+        parts.append(decoder.decode(b"", final=True))
+    finally:
+        if isinstance(source, str):
+            f.close()
+    return "".join(parts)
+
+
+def parse_pages(source: Source, file_ext: str) -> List[str]:
+    """Extract text per page, only PDFs have more than one page."""
+    if file_ext == ".pdf":
+        return extract_pages_from_pdf(source)
+    if file_ext == ".docx":
+        return [extract_text_from_docx(source)]
+    if file_ext == ".txt":
+        return [extract_text_from_txt(source)]
+    raise ValueError(f"Unsupported file type: {file_ext}")
+
+
+def content_key(digest: str, file_ext: str) -> str:
+    return f"{digest}{file_ext}.v{PARSER_VERSION}"
+
+
+class ParsedTextCache:
+    """
+    Extracted pages keyed by content hash. Recent entries are kept in memory
+    up to `max_chars`; with a `directory` every entry is also written to
+    disk so re-ingesting a file after a restart skips parsing too.
+    """
+
+    def __init__(self, max_chars: int = 50_000_000, directory: Optional[str] = None):
+        self.max_chars = max_chars
+        self.directory = directory
+        self.chars = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, List[str]]" = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def _remember(self, key: str, pages: List[str]) -> None:
+        size = sum(len(page) for page in pages)
+        if size > self.max_chars:
+            return
+        if key in self._entries:
+            self.chars -= sum(len(page) for page in self._entries.pop(key))
+        self._entries[key] = pages
+        self.chars += size
+        while self.chars > self.max_chars:
+            _, evicted = self._entries.popitem(last=False)
+            self.chars -= sum(len(page) for page in evicted)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        pages = self._entries.get(key)
+        if pages is not None:
+            self._entries.move_to_end(key)
+        elif self.directory and os.path.exists(self._path(key)):
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                pages = json.load(f)
+            self._remember(key, pages)
+        if pages is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return pages
+
+    def put(self, key: str, pages: List[str]) -> None:
+        self._remember(key, pages)
+        if self.directory:
+            temp_path = self._path(key) + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(pages, f)
+            os.replace(temp_path, self._path(key))
+
+    def memory_bytes(self) -> int:
+        # mostly ASCII text, so about a byte per character
+        return self.chars
+
+    def evict(self, nbytes: int) -> int:
+        """Drop least recently used entries from memory, disk copies stay."""
+        freed = 0
+        while self._entries and freed < nbytes:
+            _, pages = self._entries.popitem(last=False)
+            size = sum(len(page) for page in pages)
+            self.chars -= size
+            freed += size
+        return freed
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "chars": self.chars, "hits": self.hits, "misses": self.misses}
+
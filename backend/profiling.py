@@ -0,0 +1,207 @@
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+_NOOP = nullcontext()
+_current: ContextVar[Optional["Profile"]] = ContextVar("current_profile", default=None)
+
+
+def stage(name: str):
+    """
+    Time a stage of the current request, `with stage("parse"): ...`. Without
+    a profile for the request this is a context var lookup and a shared
+    no-op context manager.
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NOOP
+    return _Stage(profile, name)
+
+
+def current_profile() -> Optional["Profile"]:
+    return _current.get()
+
+
+class _Stage:
+    __slots__ = ("profile", "name", "started", "thread")
+
+    def __init__(self, profile: "Profile", name: str):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.profile._enter_thread(self.thread)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        self.profile._exit_thread(self.thread)
+        self.profile.stages.append({
+            "name": self.name,
+            "start_ms": round((self.started - self.profile.started) * 1000, 3),
+            "duration_ms": round(elapsed * 1000, 3),
+        })
+        return False
+
+
+def _collapse(frame, max_depth: int = 64) -> str:
+    # "file:function;file:function" from the outermost frame in, the format
+    # flamegraph.pl and speedscope read
+    names = []
+    while frame is not None and len(names) < max_depth:
+        code = frame.f_code
+        names.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profile:
+    """
+    Stage timings and, when `sample_interval` is set, sampled call stacks of
+    one request. Only threads currently inside a stage of this request are
+    sampled; async stages share the event loop thread with other requests,
+    so their samples can include other requests' frames.
+    """
+
+    def __init__(self, method: str, path: str, sample_interval: Optional[float] = None, reason: str = ""):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.created_at = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms: Optional[float] = None
+        self.status_code: Optional[int] = None
+        self.stages: List[dict] = []
+        self.samples: Counter = Counter()
+        self.sample_interval = sample_interval
+        self._threads: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._done = threading.Event()
+
+    def _enter_thread(self, thread: int) -> None:
+        with self._lock:
+            self._threads[thread] = self._threads.get(thread, 0) + 1
+
+    def _exit_thread(self, thread: int) -> None:
+        with self._lock:
+            count = self._threads.get(thread, 0) - 1
+            if count > 0:
+                self._threads[thread] = count
+            else:
+                self._threads.pop(thread, None)
+
+    def start(self) -> None:
+        if self.sample_interval and self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True, name=f"profile-{self.id}")
+            self._sampler.start()
+
+    def _sample(self) -> None:
+        while not self._done.wait(self.sample_interval):
+            with self._lock:
+                threads = list(self._threads)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            for thread in threads:
+                frame = frames.get(thread)
+                if frame is not None:
+                    self.samples[_collapse(frame)] += 1
+
+    def finish(self, status_code: Optional[int] = None) -> None:
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 3)
+        self.status_code = status_code
+        self._done.set()
+
+    def stage_totals(self) -> "OrderedDict[str, float]":
+        totals: "OrderedDict[str, float]" = OrderedDict()
+        for entry in self.stages:
+            totals[entry["name"]] = round(totals.get(entry["name"], 0.0) + entry["duration_ms"], 3)
+        return totals
+
+    def server_timing(self) -> str:
+        """Server-Timing header value for the stages finished so far."""
+        return ", ".join(f"{name};dur={duration}" for name, duration in self.stage_totals().items())
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "created_at": self.created_at,
+            "duration_ms": self.duration_ms,
+            "status_code": self.status_code,
+            "stages": dict(self.stage_totals()),
+        }
+
+    def to_dict(self) -> dict:
+        return dict(self.summary(), timeline=self.stages, sample_interval=self.sample_interval,
+                    samples=dict(self.samples.most_common()))
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class Profiler:
+    """
+    Decides which requests get profiled and keeps the captures.
+
+    A request is profiled when it asks for it, or for every request when
+    `slow_ms` is set so the slow ones can be kept; stack sampling is only
+    done for requests that ask for it. Captures go into a ring buffer of
+    `capacity` profiles.
+    """
+
+    def __init__(self, slow_ms: float = 0.0, capacity: int = 50, sample_interval: float = 0.005):
+        self.slow_ms = slow_ms
+        self.sample_interval = sample_interval
+        self.captures: "OrderedDict[str, Profile]" = OrderedDict()
+        self.capacity = capacity
+        self.profiled = 0
+        self.captured = 0
+
+    def begin(self, method: str, path: str, requested: bool):
+        """Start a profile for the request if wanted; returns it and the token to detach() with."""
+        if not requested and not self.slow_ms:
+            return None, None
+        profile = Profile(method, path, self.sample_interval if requested else None,
+                          reason="requested" if requested else "")
+        profile.start()
+        self.profiled += 1
+        return profile, _current.set(profile)
+
+    def detach(self, token) -> None:
+        """Clear the current profile; work already started, like a streaming body, keeps its copy."""
+        _current.reset(token)
+
+    def end(self, profile: Profile, status_code: Optional[int] = None) -> None:
+        profile.finish(status_code)
+        if profile.reason != "requested":
+            if profile.duration_ms < self.slow_ms:
+                return
+            profile.reason = "slow"
+        self.captured += 1
+        self.captures[profile.id] = profile
+        while len(self.captures) > self.capacity:
+            self.captures.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self.captures.get(profile_id)
+
+    def list(self) -> List[dict]:
+        return [profile.summary() for profile in reversed(self.captures.values())]
+
+    def stats(self) -> dict:
+        return {"slow_ms": self.slow_ms, "capacity": self.capacity, "stored": len(self.captures),
+                "profiled": self.profiled, "captured": self.captured}
@@ -0,0 +1,176 @@
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from string import Formatter
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def approximate_tokens(text: str) -> int:
+    # about four characters per token for English with Llama-style tokenizers
+    return math.ceil(len(text) / 4)
+
+
+class RenderedPrompt:
+    def __init__(self, messages: List[dict], tokens: Dict[str, int], prefix_hash: str, prefix_hit: bool,
+                 template: str):
+        self.messages = messages
+        self.tokens = tokens
+        self.prefix_hash = prefix_hash
+        self.prefix_hit = prefix_hit
+        self.template = template
+
+
+class PromptTemplate:
+    """
+    A versioned prompt. The system message holds the instructions followed
+    by the document context, so everything that stays the same across turns
+    comes first and is byte-identical whenever the same chunks are retrieved
+    in the same order, as they are for the same query; only the user message
+    changes. Ollama can then reuse the KV cache for the whole prefix. The
+    chunks keep their retrieval order, best match first. `user` is a format
+    string compiled once.
+    """
+
+    def __init__(self, name: str, version: int, system: str, user: str = "{question}",
+                 context_header: str = "Document Context:", context_separator: str = "\n\n"):
+        self.name = name
+        self.version = version
+        self.system = system.strip()
+        self.context_header = context_header
+        self.context_separator = context_separator
+        self._user_parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in Formatter().parse(user)
+        ]
+        self.fields = [field for _, field in self._user_parts if field]
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def render_prefix(self, chunks: Sequence[str]) -> str:
+        if not chunks:
+            return self.system
+        return f"{self.system}\n\n{self.context_header}\n{self.context_separator.join(chunks)}"
+
+    def render_user(self, values: Dict[str, str]) -> str:
+        parts = []
+        for literal, field in self._user_parts:
+            parts.append(literal)
+            if field:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+
+class PromptLibrary:
+    """
+    Registered templates plus the bookkeeping for them: rendered prefixes
+    are cached with their token counts, token counts are totalled per
+    section, and each render is checked against the last prefix sent to the
+    same model to estimate how often Ollama's prefix cache can be reused.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int] = approximate_tokens, prefix_cache_size: int = 128):
+        self.count_tokens = count_tokens
+        self.prefix_cache_size = prefix_cache_size
+        self.templates: Dict[str, Dict[int, PromptTemplate]] = {}
+        self._prefixes: "OrderedDict[tuple, Tuple[str, str, int, int]]" = OrderedDict()
+        self._last_prefix: Dict[str, str] = {}
+        self._stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        self.templates.setdefault(template.name, {})[template.version] = template
+        return template
+
+    def get(self, name: str, version: Optional[int] = None) -> PromptTemplate:
+        versions = self.templates.get(name)
+        if not versions:
+            raise KeyError(f"Unknown prompt template: {name}")
+        if version is None:
+            version = max(versions)
+        if version not in versions:
+            raise KeyError(f"Unknown version {version} of prompt template {name}")
+        return versions[version]
+
+    def _prefix(self, template: PromptTemplate, chunks: Sequence[str]):
+        key = (template.key, tuple(chunks))
+        with self._lock:
+            cached = self._prefixes.get(key)
+            if cached is not None:
+                self._prefixes.move_to_end(key)
+                return cached
+        prefix = template.render_prefix(chunks)
+        system_tokens = self.count_tokens(template.system)
+        context_tokens = self.count_tokens(prefix) - system_tokens if chunks else 0
+        entry = (prefix, hashlib.sha1(prefix.encode("utf-8")).hexdigest(), system_tokens, context_tokens)
+        with self._lock:
+            self._prefixes[key] = entry
+            while len(self._prefixes) > self.prefix_cache_size:
+                self._prefixes.popitem(last=False)
+        return entry
+
+    def render(self, name: str, model: str = "", chunks: Sequence[str] = (), version: Optional[int] = None,
+               **values) -> RenderedPrompt:
+        template = self.get(name, version)
+        prefix, prefix_hash, system_tokens, context_tokens = self._prefix(template, chunks)
+        user = template.render_user(values)
+        tokens = {"system": system_tokens, "context": context_tokens, "user": self.count_tokens(user)}
+
+        with self._lock:
+            prefix_hit = self._last_prefix.get(model) == prefix_hash
+            self._last_prefix[model] = prefix_hash
+            stats = self._stats.setdefault(template.key, {
+                "renders": 0, "prefix_hits": 0, "prefix_tokens_reused": 0,
+                "tokens": {"system": 0, "context": 0, "user": 0},
+            })
+            stats["renders"] += 1
+            if prefix_hit:
+                stats["prefix_hits"] += 1
+                stats["prefix_tokens_reused"] += system_tokens + context_tokens
+            for section, count in tokens.items():
+                stats["tokens"][section] += count
+
+        messages = [{"role": "system", "content": prefix}, {"role": "user", "content": user}]
+        return RenderedPrompt(messages, tokens, prefix_hash, prefix_hit, template.key)
+
+    def stats(self) -> dict:
+        templates = {}
+        with self._lock:
+            for key, stats in self._stats.items():
+                renders = stats["renders"]
+                templates[key] = dict(
+                    stats,
+                    tokens=dict(stats["tokens"]),
+                    prefix_hit_rate=round(stats["prefix_hits"] / renders, 3) if renders else 0.0,
+                    avg_tokens={section: round(total / renders, 1) for section, total in stats["tokens"].items()},
+                )
+        return {
+            "templates": {name: sorted(versions) for name, versions in self.templates.items()},
+            "cached_prefixes": len(self._prefixes),
+            "usage": templates,
+        }
+
+
+DOCUMENT_QA = PromptTemplate(
+    "document_qa", 1,
+    system="You are a helpful assistant that answers questions based on the provided document. "
+           "If the answer isn't in the document, say you don't know.",
+    user="Based on the above document, answer the following question:\n{question}",
+)
+
+GENERAL_CHAT = PromptTemplate(
+    "general_chat", 1,
+    system="You are a helpful assistant that answers questions. "
+           "Be precise and greet back if the user greets you. "
+           "Don't provide wrong information or make up answers. "
+           "Stick to what the user has asked. "
+           "Provide the number of words in the answer at the end of the answer.",
+)
+
+
+def default_library(**options) -> PromptLibrary:
+    library = PromptLibrary(**options)
+    library.register(DOCUMENT_QA)
+    library.register(GENERAL_CHAT)
+    return library
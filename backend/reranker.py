@@ -0,0 +1,109 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+# two hex digests, the key tuple, the float and the OrderedDict link
+_CACHE_ENTRY_BYTES = 360
+
+
+class Reranker:
+    """
+    Rescores bi-encoder candidates with a cross-encoder, in batches, until
+    the per-request time budget runs out. Candidates left unscored keep
+    their bi-encoder order after the reranked ones. Scores are cached per
+    (query, chunk) so repeated questions skip the model. rerank() runs in
+    worker threads, so the cache is guarded by a lock. It never loads the
+    model itself, that would be charged to no budget; until load() has been
+    called candidates keep their bi-encoder order.
+    """
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", batch_size: int = 8,
+                 budget_ms: float = 150.0, cache_size: int = 10000):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self._model = None
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_name)
+            return self._model
+
+    @staticmethod
+    def _key(query: str, chunk: str) -> Tuple[str, str]:
+        return (
+            hashlib.sha1(query.encode("utf-8")).hexdigest(),
+            hashlib.sha1(chunk.encode("utf-8")).hexdigest(),
+        )
+
+    def _cache_get(self, key) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key, score: float) -> None:
+        with self._lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def memory_bytes(self) -> int:
+        return len(self._cache) * _CACHE_ENTRY_BYTES
+
+    def evict(self, nbytes: int) -> int:
+        with self._lock:
+            count = min(len(self._cache), -(-nbytes // _CACHE_ENTRY_BYTES))
+            for _ in range(count):
+                self._cache.popitem(last=False)
+        return count * _CACHE_ENTRY_BYTES
+
+    def rerank(self, query: str, candidates: List[str], top_k: int,
+               budget_ms: Optional[float] = None) -> Tuple[List[str], dict]:
+        """Return the best `top_k` candidates and some stats about the pass."""
+        budget = (self.budget_ms if budget_ms is None else budget_ms) / 1000.0
+        deadline = time.perf_counter() + budget
+
+        scores = {}
+        pending = []
+        for position, chunk in enumerate(candidates):
+            cached = self._cache_get(self._key(query, chunk))
+            if cached is None:
+                pending.append(position)
+            else:
+                scores[position] = cached
+        cache_hits = len(scores)
+
+        # candidates arrive best-first, so a truncated pass still covers the most likely ones
+        model = self._model
+        batches = 0
+        for start in range(0, len(pending), self.batch_size):
+            if model is None or time.perf_counter() >= deadline:
+                break
+            batch = pending[start:start + self.batch_size]
+            predicted = model.predict([(query, candidates[p]) for p in batch])
+            for position, score in zip(batch, predicted):
+                scores[position] = float(score)
+                self._cache_put(self._key(query, candidates[position]), float(score))
+            batches += 1
+
+        ranked = sorted(scores, key=lambda position: -scores[position])
+        unscored = [p for p in range(len(candidates)) if p not in scores]
+        order = (ranked + unscored)[:top_k]
+        stats = {
+            "candidates": len(candidates),
+            "scored": len(scores),
+            "cache_hits": cache_hits,
+            "batches": batches,
+            "truncated": len(unscored) > 0,
+        }
+        return [candidates[p] for p in order], stats
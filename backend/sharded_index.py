@@ -0,0 +1,187 @@
+import heapq
+import multiprocessing as mp
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+def _shard_worker(conn) -> None:
+    # Each worker owns one contiguous slice of the matrix, mapped from
+    # shared memory so nothing is copied per query.
+    # The block can have spare rows at the end, only the first `rows` are live.
+    shm, block, shard, offset = None, None, None, 0
+    while True:
+        message = conn.recv()
+        command = message[0]
+        if command == "load":
+            _, name, capacity_shape, rows, offset = message
+            shard, block = None, None
+            if shm is not None:
+                shm.close()
+            shm = shared_memory.SharedMemory(name=name)
+            # the parent owns the block, don't let this process's tracker unlink it
+            resource_tracker.unregister(shm._name, "shared_memory")
+            block = np.ndarray(capacity_shape, dtype=np.float32, buffer=shm.buf)
+            shard = block[:rows]
+            conn.send(True)
+        elif command == "resize":
+            # rows were appended in place by the parent
+            shard = block[:message[1]]
+            conn.send(True)
+        elif command == "search":
+            _, query, top_k, local_rows = message
+            if shard is None or len(shard) == 0 or (local_rows is not None and len(local_rows) == 0):
+                conn.send([])
+                continue
+            if local_rows is None:
+                scores = shard @ query
+                rows = None
+            else:
+                scores = shard[local_rows] @ query
+                rows = local_rows
+            k = min(top_k, len(scores))
+            best = np.argpartition(-scores, k - 1)[:k]
+            picked = best if rows is None else rows[best]
+            conn.send([(float(scores[i]), int(row) + offset) for i, row in zip(best, picked)])
+        elif command == "stop":
+            break
+    shard, block = None, None
+    if shm is not None:
+        shm.close()
+
+
+class ShardedSearcher:
+    """
+    Splits a float32 embedding matrix into contiguous shards held in shared
+    memory, one worker process per shard. A query is sent to every shard at
+    once and the per-shard top-k lists are merged with a heap.
+
+    Appended rows go into spare capacity of the last shard, so keeping up
+    with uploads costs O(new rows); only a new matrix (after compaction or
+    a migration) or a tail grown far past the other shards is reloaded.
+
+    Workers are forked by start(), which must run before models are loaded
+    or any threads are started: forking a process that has BLAS, torch or
+    event loop threads is unsafe. spawn/forkserver would re-import the main
+    module, and with it every model, in each worker.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._context = mp.get_context("fork")
+        self._processes = []
+        self._connections = []
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self._bounds: List[int] = []
+        self._tail_capacity = 0
+        self.loaded = None  # token of the matrix currently loaded
+        self.rows = 0       # rows of that matrix loaded so far
+
+    @property
+    def started(self) -> bool:
+        return bool(self._processes)
+
+    def start(self) -> None:
+        if self._processes:
+            return
+        for _ in range(self.workers):
+            parent, child = self._context.Pipe()
+            process = self._context.Process(target=_shard_worker, args=(child,), daemon=True)
+            process.start()
+            self._processes.append(process)
+            self._connections.append(parent)
+
+    def _send_shard(self, shard_id: int, rows: np.ndarray, capacity: int):
+        """Copy `rows` into a new block with room for `capacity` rows and hand it to the worker."""
+        dim = rows.shape[1]
+        block = shared_memory.SharedMemory(create=True, size=max(capacity * dim * 4, 1))
+        np.ndarray((capacity, dim), dtype=np.float32, buffer=block.buf)[:len(rows)] = rows
+        self._connections[shard_id].send(("load", block.name, (capacity, dim), len(rows), self._bounds[shard_id]))
+        return block
+
+    def load(self, matrix: np.ndarray, token=None) -> None:
+        if not self.started:
+            raise RuntimeError("ShardedSearcher.start() must be called at startup")
+        old_blocks = self._blocks
+        self._blocks = []
+        self._bounds = np.linspace(0, len(matrix), self.workers + 1).astype(np.int64).tolist()
+        for shard_id in range(self.workers):
+            start, end = self._bounds[shard_id], self._bounds[shard_id + 1]
+            rows = np.ascontiguousarray(matrix[start:end], dtype=np.float32)
+            # the last shard takes appends, give it room to grow
+            capacity = len(rows) if shard_id < self.workers - 1 else 2 * len(rows) + 1024
+            self._blocks.append(self._send_shard(shard_id, rows, capacity))
+        self._tail_capacity = capacity
+        for conn in self._connections:
+            conn.recv()
+        for block in old_blocks:
+            block.close()
+            block.unlink()
+        self.loaded = token
+        self.rows = len(matrix)
+
+    def sync(self, matrix: np.ndarray, token) -> None:
+        """Bring the shards up to date with `matrix`, loading only what changed."""
+        if token != self.loaded or len(matrix) < self.rows:
+            self.load(matrix, token)
+            return
+        if len(matrix) == self.rows:
+            return
+        tail_start = self._bounds[-2]
+        tail_rows = len(matrix) - tail_start
+        if self.workers > 1 and tail_rows > 4 * (self._bounds[1] - self._bounds[0]) + 1024:
+            self.load(matrix, token)  # the tail outgrew the other shards, rebalance
+            return
+        shard_id = self.workers - 1
+        if tail_rows > self._tail_capacity:
+            old = self._blocks[shard_id]
+            self._tail_capacity = 2 * tail_rows
+            rows = np.ascontiguousarray(matrix[tail_start:], dtype=np.float32)
+            self._blocks[shard_id] = self._send_shard(shard_id, rows, self._tail_capacity)
+            self._connections[shard_id].recv()
+            old.close()
+            old.unlink()
+        else:
+            block = np.ndarray((self._tail_capacity, matrix.shape[1]), dtype=np.float32,
+                               buffer=self._blocks[shard_id].buf)
+            block[self.rows - tail_start:tail_rows] = matrix[self.rows:]
+            del block
+            self._connections[shard_id].send(("resize", tail_rows))
+            self._connections[shard_id].recv()
+        self._bounds[-1] = len(matrix)
+        self.rows = len(matrix)
+
+    def search(self, query: np.ndarray, top_k: int, candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if candidates is not None:
+            candidates = np.sort(np.asarray(candidates, dtype=np.int64))
+            splits = np.searchsorted(candidates, self._bounds)
+        # scatter to every shard before gathering so they all run in parallel
+        for shard_id, conn in enumerate(self._connections):
+            local_rows = None
+            if candidates is not None:
+                local_rows = candidates[splits[shard_id]:splits[shard_id + 1]] - self._bounds[shard_id]
+            conn.send(("search", query, top_k, local_rows))
+        partials = [conn.recv() for conn in self._connections]
+        merged = heapq.nlargest(top_k, (hit for partial in partials for hit in partial))
+        return [(row, score) for score, row in merged]
+
+    def memory_bytes(self) -> int:
+        """Shared memory held by the shard copies, spare tail capacity included."""
+        return sum(block.size for block in self._blocks)
+
+    def close(self) -> None:
+        for conn in self._connections:
+            try:
+                conn.send(("stop",))
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=1)
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._processes, self._connections, self._blocks = [], [], []
+        self.loaded = None
+        self.rows = 0
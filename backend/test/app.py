@@ -1,4 +1,5 @@
 import os
+import sys
 from webbrowser import get
 
 # from prompt_toolkit import prompt
@@ -17,6 +18,12 @@ import uvicorn # type: ignore
 from ollama import Client, AsyncClient # type: ignore
 import asyncio
 import datetime
+from zoneinfo import ZoneInfo
+from tool_engine import ToolExecutor, ToolRegistry
+
+# shared modules live in backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from prompts import PromptLibrary, PromptTemplate
 
 app = FastAPI()
 
@@ -36,6 +43,18 @@ embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 # Initialize Ollama client
 ollama = Client(  host='http://localhost:11434')   
 
+prompts = PromptLibrary()
+prompts.register(PromptTemplate(
+    "docy", 1,
+    system="You are a helpful assistant that answers questions based on the provided document. "
+           "If the answer isn't in the document, then ask for more info and if no info provided then say you "
+           "don't know and can only answer from document related queries. and mention at the end how many "
+           "tokens are used. If user greets you, greet back with a friendly message. "
+           "If user asks for your name, say you are a document assistant named Docy. "
+           "If user asks for your age, say you are ageless.",
+    user="Based on the above document, answer the following question:\n{question}",
+))
+
 class DocumentData:
     def __init__(self):
         self.text = ""
@@ -147,28 +166,10 @@ async def chat_with_document(request: ChatRequest):
     
     # Get relevant document chunks
     relevant_chunks = get_relevant_chunks(last_message.content)
-    context = "\n\n".join(relevant_chunks)
     print('in chat2')
-    # Prepare the prompt with context
-    prompt = f"""Document Context:{context} 
-    Based on the above document, answer the following question:
-    {last_message.content}"""
-    
-    # Add system message with instructions
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant that answers questions based on the provided document. "
-                      "If the answer isn't in the document, then ask for more info and if no info provided then say you don't know and can only answer from document related queries. and mention at the end  how many tokens are used. If user greets you, greet back with a friendly message. "
-                      "If user asks for your name, say you are a document assistant named Docy."
-                      " "
-                      "If user asks for your age, say you are ageless."
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+    # System instructions and document context first, the question last
+    messages = prompts.render("docy", model=request.model, chunks=relevant_chunks,
+                              question=last_message.content).messages
     
     try:
       
@@ -195,29 +196,25 @@ async def get_available_models():
         raise HTTPException(status_code=502, detail=str(e))
     
 #tool calling function to get current time
+tools = ToolRegistry()
 
-def get_datetime(format="%Y-%m-%d %H:%M:%S",timezone="UTC"):
+@tools.register(name="date", timeout=1.0)
+def get_datetime(format: str = "%Y-%m-%d %H:%M:%S", timezone: str = "UTC") -> str:
     """
-    Get the current time in UTC format.
+    Get the current date and time in the given IANA timezone.
     """
-    try:
-        # current_time = time.strftime(format, time.time(timezone=timezone))
-        current_time = datetime.datetime.now(timezone).strftime(format)   
-        return current_time
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
-    
-def get_my_name():
+    return datetime.datetime.now(ZoneInfo(timezone)).strftime(format)
+
+@tools.register(timeout=1.0, pure=True)
+def get_my_name() -> str:
     """
-    Get the name of the user.
+    Get the name of the assistant.
     """
     return "Docy"
 
-available_functions = {
-           'date': get_datetime,
-           'get_my_name': get_my_name,
-  
-        }  
+tool_executor = ToolExecutor(tools)
+ollama_async = AsyncClient(host='http://localhost:11434')
+
 @app.post("/current_time")
 async def get_current_time(request: ChatRequest):
 
@@ -226,9 +223,10 @@ async def get_current_time(request: ChatRequest):
     print('prompt:', prompt)
     
     try:
-        
-
-        res = ollama.chat(
+        # tool calls of a turn run concurrently and their results go back to
+        # the model until it answers without asking for more
+        res, tool_results = await tool_executor.converse(
+            ollama_async,
             model="llama3.2:3b",
             messages=[
                 {
@@ -236,39 +234,8 @@ async def get_current_time(request: ChatRequest):
                     "content": f"{prompt}"
                 }
             ],
-            stream=False,
-            tools=[
-                
-                {
-                    "name": "get_my_name",
-                    "description": "Get my name.",
-                    
-                }
-            ]
         )
-
-        if res.message.tool_calls:
-          # There may be multiple tool calls in the response
-            for tool in res.message.tool_calls:
-               # Ensure the function is available, and then call it
-              if function_to_call := available_functions.get(tool.function.name):
-                    print('Calling function:', tool.function.name)
-                    print('Arguments:', tool.function.arguments)
-                    output = function_to_call(**tool.function.arguments)
-                    print('Function output:', output)
-              else:
-                    func = tool.function.name
-                    print(res)
-                    print('Calling function:', func)
-                    
-                    func = getattr(datetime, func, None)
-                    print('Arguments:', tool.function.arguments)
-                    response = func(**tool.function.arguments)
-                    print(response)
-                    print('Function', tool.function.name, 'not found')
-        
-        # print(res)
-        return {"current_time": res['message']['content'], "response": res}
+        return {"current_time": res['message']['content'], "tool_results": tool_results, "response": res}
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
 
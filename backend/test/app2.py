@@ -1,6 +1,7 @@
 from fastapi.responses import StreamingResponse
 import asyncio
 import os
+import sys
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -15,6 +16,10 @@ import tempfile
 import uvicorn
 from ollama import Client, AsyncClient
 
+# shared modules live in backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from prompts import default_library
+
 app = FastAPI()
 
 
@@ -31,6 +36,8 @@ embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
 # Initialize Ollama client
 ollama = Client(  host='http://localhost:11434') 
+
+prompts = default_library()
 # ... (keep previous imports and setup)
 
 
@@ -142,27 +149,10 @@ async def chat_with_document_stream(request: ChatRequest):
     
     # Get relevant document chunks
     relevant_chunks = get_relevant_chunks(last_message.content)
-    context = "\n\n".join(relevant_chunks)
-    
-    # Prepare the prompt with context
-    prompt = f"""Document Context:
-{context}
-
-Based on the above document, answer the following question:
-{last_message.content}"""
     
-    # Add system message with instructions
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant that answers questions based on the provided document. "
-                      "If the answer isn't in the document, say you don't know."
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+    # System instructions and document context first, the question last
+    messages = prompts.render("document_qa", model=request.model, chunks=relevant_chunks,
+                              question=last_message.content).messages
     
     async def generate():
         try:
@@ -1,4 +1,5 @@
 import os
+import sys
 from fastapi import FastAPI, UploadFile, File, HTTPException # type: ignore
 from starlette.responses import StreamingResponse # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
@@ -15,6 +16,10 @@ from ollama import AsyncClient
 import asyncio
 import json
 
+# shared modules live in backend/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from prompts import PromptLibrary, PromptTemplate
+
 app = FastAPI()
 
 # CORS configuration
@@ -32,6 +37,14 @@ embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 # Initialize Ollama client
 ollama_ac = AsyncClient(host='http://localhost:11434')
 
+prompts = PromptLibrary()
+prompts.register(PromptTemplate(
+    "document_qa_continue", 1,
+    system="You are a helpful assistant that answers questions based on the provided document. "
+           "If the answer isn't in the document, say you don't know. Also ask the user if they want to continue.",
+    user="Based on the above document, answer the following question:\n{question}",
+))
+
 class DocumentData:
     def __init__(self):
         self.text = ""
@@ -129,24 +142,8 @@ def get_relevant_chunks(query: str, top_k: int = 3) -> List[str]:
 async def generate_response_chunks(request: ChatRequest):
     last_message = request.messages[-1]
     relevant_chunks = get_relevant_chunks(last_message.content)
-    context = "\n\n".join(relevant_chunks)
-
-    prompt = f"""Document Context:{context} 
-    Based on the above document, answer the following question:
-    {last_message.content}"""
-    
-    messages = [
-        {
-            "role": "system",
-            "content": "You are a helpful assistant that answers questions based on the provided document. "
-                       " If the answer isn't in the document, say you don't know. Also ask the user if they want to continue."
-
-        },
-        {
-            "role": "user",
-            "content": prompt
-        }
-    ]
+    messages = prompts.render("document_qa_continue", model=request.model, chunks=relevant_chunks,
+                              question=last_message.content).messages
 
     try:
         async for part in await ollama_ac.chat(model=request.model, messages=messages, stream=True):
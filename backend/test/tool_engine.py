@@ -0,0 +1,154 @@
+import asyncio
+import inspect
+import json
+import typing
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# JSON schema types for the annotations tools may use
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def _field(obj, name, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+class Tool:
+    """
+    A function the model can call. The parameter schema sent to Ollama is
+    built from the signature and type hints, and the same hints are used to
+    check and convert the arguments the model sends back.
+    """
+
+    def __init__(self, func: Callable, name: Optional[str] = None, description: Optional[str] = None,
+                 timeout: float = 5.0, pure: bool = False):
+        self.func = func
+        self.name = name or func.__name__
+        self.description = description or inspect.getdoc(func) or self.name
+        self.timeout = timeout
+        self.pure = pure  # same arguments always give the same result, safe to cache
+        self.is_async = inspect.iscoroutinefunction(func)
+        self.signature = inspect.signature(func)
+        self.hints = typing.get_type_hints(func)
+
+    def parameters(self) -> dict:
+        properties, required = {}, []
+        for name, param in self.signature.parameters.items():
+            json_type = _JSON_TYPES.get(self.hints.get(name), "string")
+            properties[name] = {"type": json_type}
+            if param.default is inspect.Parameter.empty:
+                required.append(name)
+            else:
+                properties[name]["description"] = f"default: {param.default}"
+        return {"type": "object", "properties": properties, "required": required}
+
+    def schema(self) -> dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters()},
+        }
+
+    def coerce(self, arguments: Optional[dict]) -> dict:
+        arguments = dict(arguments or {})
+        unknown = set(arguments) - set(self.signature.parameters)
+        if unknown:
+            raise TypeError(f"Unexpected arguments for {self.name}: {sorted(unknown)}")
+        for name, value in arguments.items():
+            expected = self.hints.get(name)
+            if expected in (int, float, str) and not isinstance(value, expected):
+                arguments[name] = expected(value)
+            elif expected is bool and isinstance(value, str):
+                arguments[name] = value.lower() in ("true", "1", "yes")
+        self.signature.bind(**arguments)  # raises on missing required arguments
+        return arguments
+
+
+class ToolRegistry:
+    def __init__(self):
+        self.tools: Dict[str, Tool] = {}
+
+    def register(self, func: Optional[Callable] = None, **options):
+        """Register a function, usable as @registry.register or @registry.register(timeout=1)."""
+        def decorator(f):
+            tool = Tool(f, **options)
+            self.tools[tool.name] = tool
+            return f
+        return decorator(func) if func is not None else decorator
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self.tools.get(name)
+
+    def schemas(self) -> List[dict]:
+        return [tool.schema() for tool in self.tools.values()]
+
+
+class ToolExecutor:
+    """
+    Runs the tool calls of a model turn concurrently, each with its own
+    timeout, caches results of pure tools and keeps talking to the model
+    until it answers without asking for more tools.
+    """
+
+    def __init__(self, registry: ToolRegistry, cache_size: int = 256):
+        self.registry = registry
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+
+    async def _invoke(self, tool: Tool, arguments: dict):
+        if tool.is_async:
+            return await asyncio.wait_for(tool.func(**arguments), tool.timeout)
+        # a sync tool that hangs keeps its thread, but the turn moves on
+        return await asyncio.wait_for(asyncio.to_thread(tool.func, **arguments), tool.timeout)
+
+    async def run(self, call) -> dict:
+        function = _field(call, "function")
+        name = _field(function, "name")
+        tool = self.registry.get(name)
+        if tool is None:
+            return {"role": "tool", "tool_name": name, "content": f"Error: unknown tool {name}"}
+
+        try:
+            arguments = tool.coerce(_field(function, "arguments"))
+            key = (name, json.dumps(arguments, sort_keys=True, default=str))
+            if tool.pure and key in self._cache:
+                self._cache.move_to_end(key)
+                result = self._cache[key]
+            else:
+                result = await self._invoke(tool, arguments)
+                if tool.pure:
+                    self._cache[key] = result
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+            content = result if isinstance(result, str) else json.dumps(result, default=str)
+        except asyncio.TimeoutError:
+            content = f"Error: {name} timed out after {tool.timeout}s"
+        except Exception as e:
+            # the model gets the error back and can retry or answer without it
+            content = f"Error: {e}"
+        return {"role": "tool", "tool_name": name, "content": content}
+
+    async def run_all(self, calls) -> List[dict]:
+        return list(await asyncio.gather(*[self.run(call) for call in calls]))
+
+    async def converse(self, client, model: str, messages: List[dict], max_rounds: int = 5):
+        """
+        Chat with tools until the model gives a final answer. Returns the
+        final response and the tool results of every round.
+        """
+        messages = list(messages)
+        tool_results = []
+        for _ in range(max_rounds):
+            response = await client.chat(model=model, messages=messages, tools=self.registry.schemas(), stream=False)
+            message = _field(response, "message")
+            calls = _field(message, "tool_calls")
+            if not calls:
+                return response, tool_results
+            messages.append(message)
+            results = await self.run_all(calls)
+            tool_results.extend(results)
+            messages.extend(results)
+        # out of rounds, ask for an answer with what we have
+        response = await client.chat(model=model, messages=messages, stream=False)
+        return response, tool_results
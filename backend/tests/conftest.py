@@ -0,0 +1,8 @@
+import os
+import sys
+
+# the backend modules import each other as top-level modules, and so do the
+# prototype apps in test/ with tool_engine
+_BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, _BACKEND)
+sys.path.insert(1, os.path.join(_BACKEND, "test"))
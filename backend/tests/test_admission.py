@@ -0,0 +1,89 @@
+import asyncio
+
+from admission import AdmissionController, FairScheduler, KeyPolicy
+
+
+def test_bucket_and_concurrency_limits_are_per_key():
+    admission = AdmissionController(default_policy=KeyPolicy(rate=0.001, burst=3, max_concurrent=2))
+    assert admission.admit("anonymous:10.0.0.1")[0]
+    assert admission.admit("anonymous:10.0.0.1")[0]
+    admitted, retry_after, reason = admission.admit("anonymous:10.0.0.1")
+    assert not admitted and reason == "Too many concurrent requests"
+    # another caller has its own limits
+    assert admission.admit("anonymous:10.0.0.2")[0]
+
+    admission.release("anonymous:10.0.0.1")
+    assert admission.admit("anonymous:10.0.0.1")[0]
+    admission.release("anonymous:10.0.0.1")
+    admitted, retry_after, reason = admission.admit("anonymous:10.0.0.1")
+    assert not admitted and reason == "Rate limit exceeded" and retry_after > 0
+
+
+def test_prune_folds_idle_keys_into_the_anonymous_total():
+    admission = AdmissionController({"user_a": KeyPolicy()}, default_policy=KeyPolicy(rate=1000, burst=1))
+    for address in ("10.0.0.1", "10.0.0.2"):
+        assert admission.admit(f"anonymous:{address}")[0]
+        admission.release(f"anonymous:{address}")
+    assert admission.admit("user_a")[0]
+    busy = "anonymous:10.0.0.3"
+    assert admission.admit(busy)[0]
+
+    for bucket in admission._buckets.values():
+        bucket.updated -= 10  # long enough to refill
+    assert admission.prune() == 2
+    usage = admission.usage()
+    assert set(usage) == {"anonymous", "user_a", busy}
+    assert usage["anonymous"]["requests"] == 2
+
+
+def test_scheduler_caps_concurrency_and_favours_weight():
+    admission = AdmissionController({"heavy": KeyPolicy(weight=2), "light": KeyPolicy(weight=1)})
+    scheduler = FairScheduler(1, admission)
+    order = []
+    peak = 0
+
+    async def call(key):
+        nonlocal peak
+        async with scheduler.slot(key):
+            peak = max(peak, scheduler.running)
+            order.append(key)
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(*[call(key) for key in ["light"] * 6 + ["heavy"] * 6])
+
+    asyncio.run(main())
+    assert peak == 1
+    # while both are queued the heavy key gets about two turns per light one
+    assert order[:9].count("heavy") == 6
+    assert scheduler.running == 0 and scheduler.stats()["waiting"] == 0
+    assert admission.usage()["heavy"]["llm_calls"] == 6
+
+
+def test_scheduler_releases_slot_of_cancelled_waiter():
+    scheduler = FairScheduler(1)
+
+    async def main():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot("a"):
+                await release.wait()
+
+        async def waiter():
+            async with scheduler.slot("b"):
+                pass
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        second = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        second.cancel()
+        release.set()
+        await first
+        await asyncio.gather(second, return_exceptions=True)
+        async with scheduler.slot("c"):
+            assert scheduler.running == 1
+
+    asyncio.run(main())
+    assert scheduler.running == 0
@@ -0,0 +1,49 @@
+import random
+
+from chunking import chunk_text
+
+
+def words(count, seed=0):
+    rng = random.Random(seed)
+    vocabulary = ["".join(rng.choice("abcdefghij") for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+    return [rng.choice(vocabulary) for _ in range(count)]
+
+
+def paragraphs(count, seed=0, longest=120):
+    rng = random.Random(seed)
+    text, lines = words(count, seed), []
+    while text:
+        size = rng.randint(5, longest)
+        lines.append(" ".join(text[:size]))
+        text = text[size:]
+    return "\n".join(lines)
+
+
+def test_chunks_respect_the_size_limit_and_keep_every_word():
+    text = paragraphs(5000)
+    chunks = chunk_text(text, chunk_size=1000)
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_short_lines_are_only_cut_at_line_breaks():
+    text = paragraphs(5000, longest=60)  # lines under 600 characters
+    lines = text.splitlines()
+    position = 0
+    for chunk in chunk_text(text):
+        # every chunk is a run of whole lines
+        chunk_lines = []
+        while len(" ".join(chunk_lines)) < len(chunk):
+            chunk_lines.append(lines[position])
+            position += 1
+        assert " ".join(chunk_lines) == chunk
+    assert position == len(lines)
+
+
+def test_insert_near_the_start_only_changes_nearby_chunks():
+    for text in (" ".join(words(20000)), paragraphs(20000)):
+        original = chunk_text(text)
+        head, rest = text.split(" ", 10)[:10], text.split(" ", 10)[10]
+        edited = chunk_text(" ".join(head) + " inserted " + rest)
+        assert len(set(edited) - set(original)) <= 3
+        assert len(set(original) - set(edited)) <= 3
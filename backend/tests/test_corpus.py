@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import zlib
+
+import numpy as np
+import pytest
+
+from chunking import chunk_text
+from corpus import DocumentData
+
+
+def fake_encode(texts):
+    # bag of words with a fixed random vector per word, so texts sharing
+    # words score high against each other
+    rows = []
+    for text in texts:
+        vector = np.zeros(64)
+        for word in text.split():
+            vector += np.random.default_rng(zlib.crc32(word.encode("utf-8"))).standard_normal(64)
+        rows.append(vector)
+    return np.asarray(rows, dtype=np.float32)
+
+
+def counting_encoder():
+    calls = []
+
+    def encode(texts):
+        calls.append(len(texts))
+        return fake_encode(texts)
+    return encode, calls
+
+
+def document(lines=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return "\n".join(" ".join(f"w{rng.integers(5000)}" for _ in range(rng.integers(5, 60))) for _ in range(lines))
+
+
+def test_replace_only_embeds_changed_chunks():
+    encode, calls = counting_encoder()
+    corpus = DocumentData(encode)
+    text = document()
+    document_id = corpus.add_document("notes.txt", [text], chunk_text)
+    total = corpus.documents[document_id]["chunks"]
+
+    edited = text.replace("\n", " inserted\n", 1)
+    changes = corpus.replace_document(document_id, [edited], chunk_text)
+    assert changes["embedded"] <= 2
+    assert changes["removed"] == changes["embedded"]
+    assert changes["kept"] + changes["embedded"] == total
+    assert calls[-1] == changes["embedded"]
+    assert corpus.embeddings.deleted == changes["removed"]
+
+
+def test_replace_and_delete_keep_search_consistent():
+    corpus = DocumentData(fake_encode)
+    first = corpus.add_document("a.txt", ["alpha beta gamma"], chunk_text)
+    second = corpus.add_document("b.txt", ["delta epsilon"], chunk_text)
+    assert corpus.latest_document_id == second
+
+    corpus.replace_document(first, ["alpha beta gamma\nzeta eta"], chunk_text)
+    assert "zeta eta" in corpus.search_text("zeta eta", 1)[0][0]
+
+    assert corpus.delete_document(second) == 1
+    results = corpus.search_text("delta epsilon", 5, filters={})
+    assert "delta epsilon" not in [chunk for chunk, _ in results]
+    assert corpus.latest_document_id == first
+
+    assert corpus.compact()
+    assert corpus.embeddings.deleted == 0
+    assert " ".join(corpus.chunks) == "alpha beta gamma zeta eta"
+
+
+def small_encode(texts):
+    # a second model: other word vectors and another dimension
+    rows = []
+    for text in texts:
+        vector = np.zeros(32)
+        for word in text.split():
+            vector += np.random.default_rng(zlib.crc32(b"v2" + word.encode("utf-8"))).standard_normal(32)
+        rows.append(vector)
+    return np.asarray(rows, dtype=np.float32)
+
+
+def test_migration_catches_up_and_swaps_models():
+    corpus = DocumentData(fake_encode, embedding_model="old", embedding_dim=64)
+    kept = corpus.add_document("a.txt", [document(seed=1)], chunk_text)
+    doomed = corpus.add_document("b.txt", [document(seed=2)], chunk_text)
+    reading, swapped = threading.Event(), threading.Event()
+
+    def late_chunker(text):
+        reading.set()
+        swapped.wait()
+        return chunk_text(text)
+
+    async def run():
+        task = corpus.migrate_embeddings("new", small_encode, 32, batch_size=4, pause=0.005)
+        while not corpus.migration["done"]:
+            await asyncio.sleep(0.001)
+        added = corpus.add_document("c.txt", ["mid migration upload"], chunk_text)
+        removed = corpus.delete_document(doomed)
+        assert not corpus.compact()
+        assert corpus.migration["state"] == "running"
+        # read before the swap, written after it: must not mix the two models
+        replace = asyncio.ensure_future(asyncio.to_thread(corpus.replace_document, kept, ["new"], late_chunker))
+        await asyncio.to_thread(reading.wait)
+        assert corpus.migration["state"] == "running"
+        await task
+        swapped.set()
+        with pytest.raises(RuntimeError):
+            await replace
+        return added, removed
+
+    added, removed = asyncio.run(run())
+    assert corpus.migration["state"] == "done"
+    assert corpus.embedding_model == "new" and corpus.embedding_dim == 32
+    assert corpus.encode is small_encode
+    assert corpus.embeddings.count == len(corpus.chunks)
+    assert corpus.embeddings.compact.shape[1] == 32
+    assert corpus.embeddings.deleted == removed > 0
+
+    results = corpus.search_text("mid migration upload", 1, filters={})
+    assert results[0][0] == "mid migration upload"
+    doomed_rows = set(corpus.metadata.posting("document_id", doomed))
+    assert not doomed_rows & set(np.flatnonzero(corpus.embeddings.live))
+    assert corpus.search_text("anything", 5, filters={"document_id": doomed}) == []
+    assert corpus.latest_document_id == added
+    assert corpus.compact()
+
+
+def test_failed_migration_keeps_old_index():
+    corpus = DocumentData(fake_encode, embedding_model="old", embedding_dim=64)
+    corpus.add_document("a.txt", [document(seed=3)], chunk_text)
+    before = corpus.embeddings
+    calls = []
+
+    def failing_encode(texts):
+        calls.append(len(texts))
+        if len(calls) == 2:
+            raise RuntimeError("model crashed")
+        return small_encode(texts)
+
+    async def run(encode):
+        await corpus.migrate_embeddings("new", encode, 32, batch_size=4, pause=0)
+
+    asyncio.run(run(failing_encode))
+    assert corpus.migration["state"] == "failed" and "model crashed" in corpus.migration["error"]
+    assert corpus.embedding_model == "old" and corpus.embedding_dim == 64
+    assert corpus.encode is fake_encode and corpus.embeddings is before
+    assert corpus.search_text(corpus.chunks[0], 1)[0][0] == corpus.chunks[0]
+
+    # compaction and later migrations are allowed again
+    asyncio.run(run(small_encode))
+    assert corpus.migration["state"] == "done" and corpus.embedding_dim == 32
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from embedding_models import EmbeddingModelRegistry
+
+
+class StubModel:
+    def __init__(self, name):
+        self.name = name
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+    def encode(self, texts):
+        return np.ones((len(texts), 8), dtype=np.float32)
+
+
+def test_models_load_once_and_report_their_dimension():
+    loaded = []
+
+    def loader(name):
+        loaded.append(name)
+        return StubModel(name)
+
+    registry = EmbeddingModelRegistry({"small": {"dim": None, "notes": ""}}, loader=loader)
+    assert "small" in registry and "other" not in registry
+    assert registry.describe() == [{"dim": None, "notes": "", "name": "small", "loaded": False}]
+
+    assert registry.dimension("small") == 8
+    assert registry.encoder("small")(["a", "b"]).shape == (2, 8)
+    assert loaded == ["small"]
+    assert registry.describe()[0]["loaded"]
+
+
+def test_unknown_model_is_rejected():
+    registry = EmbeddingModelRegistry(loader=StubModel)
+    with pytest.raises(KeyError):
+        registry.get("not-a-model")
+    registry.register("custom", notes="added at runtime")
+    assert registry.get("custom").name == "custom"
+    assert registry.dimension("custom") == 8
@@ -0,0 +1,48 @@
+import pytest
+
+from memory_accounting import MemoryAccountant, MemoryBudgetExceeded
+
+
+class Consumer:
+    def __init__(self, size):
+        self.size = size
+
+    def bytes(self):
+        return self.size
+
+    def evict(self, nbytes):
+        freed = min(self.size, nbytes)
+        self.size -= freed
+        return freed
+
+
+def test_eviction_asks_low_priority_consumers_first():
+    memory = MemoryAccountant(budget=100)
+    cache, corpus = Consumer(60), Consumer(60)
+    memory.register("cache", "cache", cache.bytes, cache.evict, priority=0)
+    memory.register("corpus", "corpus", corpus.bytes, corpus.evict, priority=10)
+    assert memory.enforce()
+    assert (cache.size, corpus.size) == (40, 60)
+    assert memory.enforce(70)
+    assert (cache.size, corpus.size) == (0, 30)
+
+
+def test_reservations_count_until_released_and_refuse_what_cannot_fit():
+    memory = MemoryAccountant(budget=100)
+    fixed = Consumer(50)
+    memory.register("index", "index", fixed.bytes)  # nothing to evict
+    with memory.reserve(40, "upload"):
+        assert memory.used() == 90
+        with pytest.raises(MemoryBudgetExceeded):
+            with memory.reserve(20, "upload"):
+                pass
+    assert memory.used() == 50
+    assert memory.breakdown()["refused"] == 1
+
+
+def test_zero_budget_only_tracks():
+    memory = MemoryAccountant()
+    memory.register("corpus", "corpus", lambda: {"chunks": 10, "embeddings": 5})
+    with memory.reserve(10**12):
+        assert memory.available() is None
+    assert memory.breakdown()["consumers"][0]["parts"] == {"chunks": 10, "embeddings": 5}
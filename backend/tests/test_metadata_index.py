@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from metadata_index import MetadataIndex
+
+
+@pytest.fixture
+def index():
+    index = MetadataIndex()
+    index.add([
+        {"document_id": "a", "filename": "a.pdf", "file_type": "pdf", "page": 1, "uploaded_at": "2025-01-01T00:00:00"},
+        {"document_id": "a", "filename": "a.pdf", "file_type": "pdf", "page": 2, "uploaded_at": "2025-01-01T00:00:00"},
+        {"document_id": "b", "filename": "b.txt", "file_type": "txt", "page": 1, "uploaded_at": "2025-03-01T00:00:00"},
+    ])
+    return index
+
+
+def test_filters_combine(index):
+    assert index.evaluate(None) is None
+    np.testing.assert_array_equal(index.evaluate({"document_id": "a"}), [True, True, False])
+    np.testing.assert_array_equal(index.evaluate({"file_type": ["pdf", "txt"], "page": 1}), [True, False, True])
+    np.testing.assert_array_equal(index.evaluate({"page": {"gt": 1}}), [False, True, False])
+    np.testing.assert_array_equal(index.evaluate({"uploaded_at": {"gte": "2025-02-01"}}), [False, False, True])
+
+
+@pytest.mark.parametrize("filters", [
+    {"page": [1, 2]},
+    {"page": {"gte": None}},
+    {"page": {"between": 1}},
+    {"page": "first"},
+    {"uploaded_at": {"gte": "yesterday"}},
+    {"document_id": {"id": "a"}},
+    {"owner": "me"},
+])
+def test_bad_filters_raise_value_error(index, filters):
+    with pytest.raises(ValueError):
+        index.evaluate(filters)
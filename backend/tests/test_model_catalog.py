@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from model_catalog import ModelCatalog
+
+
+class StubOllama:
+    """list() returns `names`, or raises while `error` is set; it can be held with `gate`."""
+
+    def __init__(self, *names):
+        self.names = list(names)
+        self.error = None
+        self.gate = None
+        self.list_calls = 0
+
+    async def list(self):
+        self.list_calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return {"models": [{"model": name, "size": 1, "details": {"family": "llama"}} for name in self.names]}
+
+    async def show(self, name):
+        return {"modelinfo": {"llama.context_length": 8192}}
+
+
+def test_stale_read_returns_cached_list_and_refreshes_once():
+    client = StubOllama("llama3:latest")
+    catalog = ModelCatalog(client, ttl=60)
+
+    async def run():
+        await catalog.get()
+        assert catalog.models["llama3:latest"]["context_length"] == 8192
+        client.names.append("gemma3:latest")
+        catalog.updated_at = time.monotonic() - 120
+        client.gate = asyncio.Event()
+
+        reads = [await catalog.get() for _ in range(3)]
+        await asyncio.sleep(0)
+        assert all(list(models) == ["llama3:latest"] for models in reads)
+        assert client.list_calls == 2
+
+        client.gate.set()
+        await catalog._refresh_task
+        assert set(await catalog.get()) == {"llama3:latest", "gemma3:latest"}
+        assert client.list_calls == 2
+
+    asyncio.run(run())
+
+
+def test_failed_refresh_keeps_previous_list():
+    client = StubOllama("llama3:latest")
+    catalog = ModelCatalog(client, ttl=60)
+
+    async def run():
+        await catalog.refresh()
+        client.error = ConnectionError("ollama is down")
+        catalog.updated_at = time.monotonic() - 120
+        assert list(await catalog.get()) == ["llama3:latest"]
+        await catalog._refresh_task
+        assert catalog.last_error == "ollama is down"
+        assert list(catalog.models) == ["llama3:latest"]
+        assert catalog.stats()["stale"]
+
+        client.error = None
+        await catalog.refresh()
+        assert catalog.last_error is None
+
+    asyncio.run(run())
+
+
+def test_contains_treats_bare_name_as_latest():
+    catalog = ModelCatalog(StubOllama("gemma3:latest", "qwen2:7b"))
+
+    async def run():
+        assert await catalog.contains("gemma3") is True
+        assert await catalog.contains("gemma3:latest") is True
+        assert await catalog.contains("qwen2:7b") is True
+        assert await catalog.contains("qwen2") is False
+
+    asyncio.run(run())
+
+
+def test_misses_refresh_at_most_every_miss_refresh_after():
+    client = StubOllama("llama3:latest")
+    catalog = ModelCatalog(client, miss_refresh_after=5)
+
+    async def run():
+        await catalog.refresh()
+        client.names.append("phi3:latest")
+        assert await catalog.contains("phi3") is False
+        assert client.list_calls == 1  # refreshed just now, no recheck
+
+        catalog.updated_at = time.monotonic() - 10
+        assert await catalog.contains("phi3") is True
+        assert client.list_calls == 2
+        assert await catalog.contains("missing") is False
+        assert client.list_calls == 2
+
+    asyncio.run(run())
+
+
+def test_unknown_when_ollama_was_never_reachable():
+    client = StubOllama("llama3:latest")
+    client.error = ConnectionError("refused")
+    catalog = ModelCatalog(client)
+
+    async def run():
+        # None, not False: ensure_known_model lets the request through
+        assert await catalog.contains("llama3") is None
+        assert not catalog.loaded and catalog.last_error == "refused"
+        client.error = None
+        assert await catalog.contains("llama3") is True
+
+    asyncio.run(run())
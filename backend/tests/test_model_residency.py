@@ -0,0 +1,107 @@
+import asyncio
+
+from model_residency import ResidencyManager, canonical_model
+
+
+class StubBackend:
+    """Stands in for Ollama: remembers what is loaded and what was asked."""
+
+    def __init__(self, resident=None):
+        self.resident = dict(resident or {})
+        self.loads = []
+        self.unloads = []
+
+    async def load(self, model, keep_alive):
+        self.loads.append((model, keep_alive))
+        self.resident[model] = 1
+
+    async def unload(self, model):
+        self.unloads.append(model)
+        self.resident.pop(model, None)
+
+    async def loaded(self):
+        return dict(self.resident)
+
+
+GB = 2**30
+
+
+def test_rate_window_drops_old_requests():
+    manager = ResidencyManager(StubBackend(), window=60.0)
+    manager.begin("gemma3")
+    manager.begin("gemma3")
+    assert manager.rate("gemma3:latest") == 2.0
+    assert manager.rate("gemma3:latest", now=manager._requests["gemma3:latest"][-1] + 61) == 0.0
+
+
+def test_keep_alive_tiers_follow_request_rate():
+    manager = ResidencyManager(StubBackend(), window=60.0, hot_rate=3.0, warm_rate=1.0, preload=["llama3"])
+    assert manager.keep_alive_for("phi3") == "1m"
+    # preloaded models never drop below the warm tier
+    assert manager.keep_alive_for("llama3") == "5m"
+    assert manager.begin("phi3") == "5m"
+    manager.begin("phi3")
+    assert manager.begin("phi3") == "30m"
+    for _ in range(3):
+        manager.end("phi3")
+    assert manager.stats()["models"]["phi3:latest"]["requests"] == 3
+
+
+def test_cold_starts_are_counted_from_load_duration():
+    manager = ResidencyManager(StubBackend(), cold_start_seconds=1.0)
+    manager.begin("gemma3")
+    manager.end("gemma3", load_duration_ns=int(2.5e9))
+    manager.begin("gemma3")
+    manager.end("gemma3", load_duration_ns=int(0.01e9))
+    stats = manager.stats()["models"]["gemma3:latest"]
+    assert stats["cold_starts"] == 1
+    assert stats["load_seconds_max"] == 2.5
+
+
+def test_rebalance_unloads_coldest_idle_models_over_budget():
+    sizes = {"a:latest": 4 * GB, "b:latest": 4 * GB, "c:latest": 4 * GB}
+    backend = StubBackend(sizes)
+    manager = ResidencyManager(backend, memory_budget=8 * GB, size_of=sizes.get, hot_rate=100)
+    for _ in range(3):
+        manager.begin("a")
+        manager.end("a")
+    manager.begin("b")
+    manager.end("b")
+    # c has the fewest requests but is busy, so it must stay
+    manager.begin("c")
+
+    asyncio.run(manager.rebalance())
+    assert backend.unloads == ["b:latest"]
+    assert set(manager.resident) == {"a:latest", "c:latest"}
+    assert manager.stats()["models"]["b:latest"]["unloads"] == 1
+
+
+def test_rebalance_loads_hot_models_that_fit():
+    sizes = {"a:latest": 4 * GB, "b:latest": 4 * GB}
+    backend = StubBackend({"a:latest": 4 * GB})
+    manager = ResidencyManager(backend, memory_budget=6 * GB, size_of=sizes.get, window=60.0, hot_rate=1.0)
+    manager.begin("b")
+    manager.end("b")
+    # b is hot but doesn't fit next to a
+    asyncio.run(manager.rebalance())
+    assert backend.loads == []
+
+    backend.resident.clear()
+    asyncio.run(manager.rebalance())
+    assert backend.loads == [("b:latest", manager.keep_alive_hot)]
+
+
+def test_preload_skips_models_over_budget_and_missing_ones():
+    class FailingBackend(StubBackend):
+        async def load(self, model, keep_alive):
+            if model == "missing:latest":
+                raise RuntimeError("model not found")
+            await super().load(model, keep_alive)
+
+    sizes = {"small:latest": GB, "large:latest": 10 * GB}
+    backend = FailingBackend()
+    manager = ResidencyManager(backend, memory_budget=4 * GB, size_of=sizes.get,
+                               preload=["missing", "small", "large"])
+    asyncio.run(manager.preload())
+    assert [model for model, _ in backend.loads] == ["small:latest"]
+    assert canonical_model("small") in manager.resident
@@ -0,0 +1,64 @@
+import io
+import zipfile
+
+import pytest
+
+from parsers import ParsedTextCache, detect_encoding, extract_text_from_docx, extract_text_from_txt
+
+W = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+     'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+     'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape"')
+
+
+def docx(body: str) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("word/document.xml", f"<w:document {W}><w:body>{body}</w:body></w:document>")
+    buffer.seek(0)
+    return buffer
+
+
+def test_docx_tab_stops_are_not_text():
+    body = ('<w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>'
+            '<w:r><w:t>Hello</w:t><w:tab/><w:t>world</w:t></w:r><w:r><w:br/><w:t>again</w:t></w:r></w:p>')
+    assert extract_text_from_docx(docx(body)) == "Hello\tworld\nagain"
+
+
+def test_docx_tables_become_rows():
+    cell = '<w:tc><w:p><w:r><w:t>{}</w:t></w:r></w:p></w:tc>'
+    body = ('<w:p><w:r><w:t>Before</w:t></w:r></w:p>'
+            f'<w:tbl><w:tr>{cell.format("a")}{cell.format("b")}</w:tr></w:tbl>')
+    assert extract_text_from_docx(docx(body)) == "Before\na | b"
+
+
+def test_docx_text_box_is_read_once_without_splitting_its_paragraph():
+    box = ('<w:txbxContent><w:p><w:pPr><w:tabs><w:tab w:val="left" w:pos="720"/></w:tabs></w:pPr>'
+           '<w:r><w:t>BOX TEXT</w:t></w:r></w:p></w:txbxContent>')
+    body = ('<w:p><w:r><w:t>Before box.</w:t></w:r>'
+            '<w:r><mc:AlternateContent>'
+            f'<mc:Choice Requires="wps"><w:drawing><wps:txbx>{box}</wps:txbx></w:drawing></mc:Choice>'
+            f'<mc:Fallback><w:pict><w:txbx>{box}</w:txbx></w:pict></mc:Fallback>'
+            '</mc:AlternateContent></w:r>'
+            '<w:r><w:t xml:space="preserve"> After box.</w:t></w:r></w:p>')
+    assert extract_text_from_docx(docx(body)) == "BOX TEXT\nBefore box. After box."
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "utf-16-le", "utf-16-be", "utf-32-le", "utf-32-be", "utf-8-sig", "utf-16"])
+def test_txt_encodings_round_trip(encoding):
+    text = "hello world, plain text with an accent: café\n" * 50
+    assert extract_text_from_txt(io.BytesIO(text.encode(encoding))) == text
+
+
+def test_detect_encoding_without_bom():
+    assert detect_encoding("hello".encode("utf-16-le")) == "utf-16-le"
+    assert detect_encoding("hello".encode("utf-16-be")) == "utf-16-be"
+    assert detect_encoding("hello".encode("utf-8")) == "utf-8"
+
+
+def test_parsed_text_cache_evicts_and_persists(tmp_path):
+    cache = ParsedTextCache(max_chars=10, directory=str(tmp_path))
+    cache.put("a", ["12345"])
+    cache.put("b", ["1234567"])
+    assert cache.stats()["entries"] == 1  # "a" fell out of memory
+    assert cache.get("a") == ["12345"]     # but comes back from disk
+    assert ParsedTextCache(directory=str(tmp_path)).get("b") == ["1234567"]
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import time
+
+from profiling import Profiler, stage
+
+
+def busy(seconds):
+    with stage("parse"):
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            sum(range(1000))
+        return threading.get_ident()
+
+
+def test_disabled_profiling_is_a_no_op():
+    profiler = Profiler()
+    assert profiler.begin("GET", "/", requested=False) == (None, None)
+    with stage("anything") as entered:
+        assert entered is None
+
+
+def test_requested_profile_samples_the_worker_thread():
+    profiler = Profiler(sample_interval=0.001)
+
+    async def request():
+        profile, token = profiler.begin("POST", "/upload", requested=True)
+        await asyncio.to_thread(busy, 0.1)
+        profiler.detach(token)
+        profiler.end(profile, 200)
+        return profile
+
+    profile = asyncio.run(request())
+    assert set(profile.stage_totals()) == {"parse"}
+    assert profile.samples
+    assert all(stack.endswith("busy") for stack in profile.samples)
+    assert profiler.get(profile.id) is profile
+    assert "parse;dur=" in profile.server_timing()
+
+
+def test_only_slow_requests_are_captured_in_a_ring():
+    profiler = Profiler(slow_ms=20, capacity=2)
+    for seconds in (0.0, 0.03, 0.03, 0.03):
+        profile, token = profiler.begin("GET", "/chat", requested=False)
+        busy(seconds)
+        profiler.detach(token)
+        profiler.end(profile, 200)
+        assert profile.sample_interval is None
+    assert profiler.stats()["captured"] == 3
+    assert [summary["reason"] for summary in profiler.list()] == ["slow", "slow"]
@@ -0,0 +1,31 @@
+from prompts import default_library
+
+
+def test_chunks_keep_retrieval_order():
+    library = default_library()
+    rendered = library.render("document_qa", model="m", chunks=["zebra facts", "apple facts"], question="q?")
+    system = rendered.messages[0]["content"]
+    assert system.index("zebra facts") < system.index("apple facts")
+    assert rendered.messages[1]["content"].endswith("q?")
+
+
+def test_repeated_prefix_counts_as_hit():
+    library = default_library()
+    chunks = ["first chunk", "second chunk"]
+    first = library.render("document_qa", model="m", chunks=chunks, question="one")
+    second = library.render("document_qa", model="m", chunks=chunks, question="two")
+    reordered = library.render("document_qa", model="m", chunks=chunks[::-1], question="three")
+    assert not first.prefix_hit and second.prefix_hit and not reordered.prefix_hit
+    assert first.prefix_hash == second.prefix_hash != reordered.prefix_hash
+
+    usage = library.stats()["usage"]["document_qa@v1"]
+    assert usage["renders"] == 3 and usage["prefix_hits"] == 1
+    assert usage["prefix_tokens_reused"] == second.tokens["system"] + second.tokens["context"]
+    assert second.tokens["context"] > 0
+
+
+def test_no_chunks_renders_system_only():
+    library = default_library()
+    rendered = library.render("general_chat", chunks=[], question="hi")
+    assert rendered.tokens["context"] == 0
+    assert rendered.messages[0]["content"] == library.get("general_chat").system
@@ -0,0 +1,82 @@
+import time
+
+from reranker import _CACHE_ENTRY_BYTES, Reranker
+
+
+class StubCrossEncoder:
+    """Scores a pair by the number in the chunk, optionally slowly."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.pairs = []
+
+    def predict(self, pairs):
+        self.pairs.extend(pairs)
+        time.sleep(self.delay)
+        return [float(chunk.split()[-1]) for _, chunk in pairs]
+
+
+def reranker_with(model, **options) -> Reranker:
+    reranker = Reranker(**options)
+    reranker._model = model
+    return reranker
+
+
+def test_rerank_orders_by_cross_encoder_score():
+    reranker = reranker_with(StubCrossEncoder(), batch_size=2)
+    ranked, stats = reranker.rerank("q", ["c 1", "c 3", "c 2"], top_k=2)
+    assert ranked == ["c 3", "c 2"]
+    assert stats == {"candidates": 3, "scored": 3, "cache_hits": 0, "batches": 2, "truncated": False}
+
+
+def test_budget_truncates_and_unscored_keep_bi_encoder_order():
+    model = StubCrossEncoder(delay=0.05)
+    reranker = reranker_with(model, batch_size=2, budget_ms=20)
+    candidates = ["c 1", "c 2", "c 9", "c 8", "c 7"]
+    ranked, stats = reranker.rerank("q", candidates, top_k=5)
+    assert stats["batches"] == 1 and stats["scored"] == 2 and stats["truncated"]
+    assert ranked == ["c 2", "c 1", "c 9", "c 8", "c 7"]
+    assert len(model.pairs) == 2
+
+
+def test_cached_pairs_skip_predict():
+    model = StubCrossEncoder()
+    reranker = reranker_with(model, batch_size=4)
+    reranker.rerank("q", ["c 1", "c 2"], top_k=2)
+    model.pairs.clear()
+
+    ranked, stats = reranker.rerank("q", ["c 2", "c 1", "c 5"], top_k=3)
+    assert ranked == ["c 5", "c 2", "c 1"]
+    assert stats["cache_hits"] == 2
+    assert model.pairs == [("q", "c 5")]
+
+    reranker.rerank("other question", ["c 1"], top_k=1)
+    assert model.pairs[-1] == ("other question", "c 1")
+
+
+def test_unloaded_model_keeps_bi_encoder_order():
+    reranker = Reranker()
+    ranked, stats = reranker.rerank("q", ["c 1", "c 3", "c 2"], top_k=2)
+    assert ranked == ["c 1", "c 3"]
+    assert stats["scored"] == 0 and stats["truncated"]
+    assert reranker._model is None
+
+
+def test_evict_accounts_whole_entries():
+    reranker = reranker_with(StubCrossEncoder(), cache_size=10)
+    reranker.rerank("q", [f"c {i}" for i in range(8)], top_k=1)
+    assert reranker.memory_bytes() == 8 * _CACHE_ENTRY_BYTES
+
+    assert reranker.evict(_CACHE_ENTRY_BYTES + 1) == 2 * _CACHE_ENTRY_BYTES
+    assert reranker.memory_bytes() == 6 * _CACHE_ENTRY_BYTES
+    assert reranker.evict(100 * _CACHE_ENTRY_BYTES) == 6 * _CACHE_ENTRY_BYTES
+    assert reranker.memory_bytes() == 0
+
+
+def test_cache_is_bounded_oldest_first():
+    model = StubCrossEncoder()
+    reranker = reranker_with(model, cache_size=2)
+    reranker.rerank("q", ["c 1", "c 2", "c 3"], top_k=1)
+    model.pairs.clear()
+    reranker.rerank("q", ["c 1", "c 3"], top_k=1)
+    assert model.pairs == [("q", "c 1")]
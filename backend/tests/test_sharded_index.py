@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from sharded_index import ShardedSearcher
+from vector_store import EmbeddingStore, normalize
+
+
+@pytest.fixture
+def searcher():
+    searcher = ShardedSearcher(3)
+    searcher.start()
+    yield searcher
+    searcher.close()
+
+
+def exact_top(matrix, query, k):
+    scores = matrix @ normalize(query)
+    return [int(row) for row in np.argsort(-scores)[:k]]
+
+
+def test_load_requires_started_workers():
+    with pytest.raises(RuntimeError):
+        ShardedSearcher(2).load(np.zeros((4, 8), dtype=np.float32))
+
+
+def test_sync_appends_into_the_tail_shard(searcher):
+    rng = np.random.default_rng(0)
+    store = EmbeddingStore("float32")
+    store.append(rng.standard_normal((3000, 32)))
+    searcher.sync(store.compact, token=store.id)
+    first_blocks = [block.name for block in searcher._blocks]
+
+    for _ in range(5):
+        store.append(rng.standard_normal((200, 32)))
+        searcher.sync(store.compact, token=store.id)
+        query = rng.standard_normal(32)
+        assert [row for row, _ in searcher.search(normalize(query), 5)] == exact_top(store.compact, query, 5)
+
+    # the leading shards were never copied again
+    assert [block.name for block in searcher._blocks][:2] == first_blocks[:2]
+    assert searcher.rows == store.count
+
+
+def test_new_store_is_reloaded_and_candidates_are_respected(searcher):
+    rng = np.random.default_rng(1)
+    store = EmbeddingStore("float32")
+    store.append(rng.standard_normal((500, 16)))
+    searcher.sync(store.compact, token=store.id)
+
+    rewritten = store.rewritten(np.arange(100, 500))
+    searcher.sync(rewritten.compact, token=rewritten.id)
+    assert searcher.rows == 400
+    query = rng.standard_normal(16)
+    candidates = np.arange(0, 400, 7)
+    expected = [int(candidates[i]) for i in exact_top(rewritten.compact[candidates], query, 3)]
+    assert [row for row, _ in searcher.search(normalize(query), 3, candidates=candidates)] == expected
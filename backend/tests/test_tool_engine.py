@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+from tool_engine import Tool, ToolExecutor, ToolRegistry
+
+
+def call(name, **arguments):
+    return {"function": {"name": name, "arguments": arguments}}
+
+
+class StubClient:
+    """Answers with the scripted messages in turn and records every request."""
+
+    def __init__(self, *messages):
+        self.messages = list(messages)
+        self.requests = []
+
+    async def chat(self, **request):
+        self.requests.append(request)
+        message = self.messages.pop(0) if self.messages else {"role": "assistant", "content": "done"}
+        return {"message": message}
+
+
+def registry_with_sleepers():
+    registry = ToolRegistry()
+
+    @registry.register
+    async def slow(seconds: float) -> str:
+        await asyncio.sleep(seconds)
+        return f"slept {seconds}"
+
+    @registry.register(timeout=0.05)
+    async def hangs() -> str:
+        await asyncio.sleep(10)
+        return "never"
+
+    @registry.register(name="blocking", timeout=1)
+    def blocking_sleep(seconds: float) -> str:
+        time.sleep(seconds)
+        return "ok"
+
+    return registry
+
+
+def test_calls_of_one_turn_run_concurrently():
+    executor = ToolExecutor(registry_with_sleepers())
+    calls = [call("slow", seconds=0.2), call("slow", seconds=0.1), call("blocking", seconds=0.2)]
+
+    started = time.perf_counter()
+    results = asyncio.run(executor.run_all(calls))
+    elapsed = time.perf_counter() - started
+
+    assert [r["content"] for r in results] == ["slept 0.2", "slept 0.1", "ok"]
+    assert elapsed < 0.4
+
+
+def test_timeout_becomes_an_error_result():
+    executor = ToolExecutor(registry_with_sleepers())
+    result, fast = asyncio.run(executor.run_all([call("hangs"), call("slow", seconds=0)]))
+    assert result == {"role": "tool", "tool_name": "hangs", "content": "Error: hangs timed out after 0.05s"}
+    assert fast["content"] == "slept 0.0"
+
+
+def test_only_pure_tools_are_cached():
+    registry = ToolRegistry()
+    counts = {"square": 0, "now": 0}
+
+    @registry.register(pure=True)
+    def square(x: int) -> int:
+        counts["square"] += 1
+        return x * x
+
+    @registry.register
+    def now() -> int:
+        counts["now"] += 1
+        return counts["now"]
+
+    executor = ToolExecutor(registry, cache_size=1)
+    first = asyncio.run(executor.run(call("square", x=3)))
+    # "3" coerces to 3, so it hits the same entry
+    second = asyncio.run(executor.run(call("square", x="3")))
+    assert first["content"] == second["content"] == "9"
+    assert counts["square"] == 1
+
+    asyncio.run(executor.run(call("square", x=4)))
+    asyncio.run(executor.run(call("square", x=3)))
+    assert counts["square"] == 3  # evicted by the cache size of one
+
+    assert [asyncio.run(executor.run(call("now")))["content"] for _ in range(2)] == ["1", "2"]
+
+
+def test_unknown_tools_and_bad_arguments_go_back_to_the_model():
+    registry = ToolRegistry()
+
+    @registry.register
+    def add(a: int, b: int = 1) -> int:
+        return a + b
+
+    executor = ToolExecutor(registry)
+    unknown, extra, missing, bad = asyncio.run(executor.run_all([
+        call("subtract", a=1), call("add", a=1, c=2), call("add", b=2), call("add", a="one"),
+    ]))
+    assert unknown["content"] == "Error: unknown tool subtract"
+    assert extra["content"].startswith("Error: Unexpected arguments for add")
+    assert missing["content"].startswith("Error:") and "a" in missing["content"]
+    assert bad["content"].startswith("Error: invalid literal")
+
+
+def test_converse_feeds_results_back_until_an_answer():
+    registry = ToolRegistry()
+
+    @registry.register
+    def add(a: int, b: int) -> int:
+        return a + b
+
+    client = StubClient({"role": "assistant", "tool_calls": [call("add", a=1, b=2)]},
+                        {"role": "assistant", "content": "3"})
+    response, results = asyncio.run(ToolExecutor(registry).converse(client, "m", [{"role": "user", "content": "?"}]))
+    assert response["message"]["content"] == "3"
+    assert results == [{"role": "tool", "tool_name": "add", "content": "3"}]
+    assert client.requests[1]["messages"][-1] == results[0]
+    assert all(request["tools"] for request in client.requests)
+
+
+def test_converse_asks_without_tools_after_max_rounds():
+    registry = ToolRegistry()
+
+    @registry.register
+    def ping() -> str:
+        return "pong"
+
+    looping = {"role": "assistant", "tool_calls": [call("ping")]}
+    client = StubClient(looping, looping, {"role": "assistant", "content": "gave up"})
+    response, results = asyncio.run(ToolExecutor(registry).converse(client, "m", [], max_rounds=2))
+    assert response["message"]["content"] == "gave up"
+    assert len(results) == 2
+    assert len(client.requests) == 3
+    assert "tools" not in client.requests[-1]
+
+
+def test_parameters_schema_from_type_hints():
+    def search(query: str, limit: int = 5, score: float = 0.5, exact: bool = False, tags: list = None, extra=None):
+        """Search the documents."""
+
+    tool = Tool(search)
+    assert tool.description == "Search the documents."
+    assert tool.parameters() == {
+        "type": "object",
+        "properties": {
+            "query": {"type": "string"},
+            "limit": {"type": "integer", "description": "default: 5"},
+            "score": {"type": "number", "description": "default: 0.5"},
+            "exact": {"type": "boolean", "description": "default: False"},
+            "tags": {"type": "array", "description": "default: None"},
+            "extra": {"type": "string", "description": "default: None"},
+        },
+        "required": ["query"],
+    }
+    assert tool.schema()["function"]["name"] == "search"
+    assert tool.coerce({"query": 1, "exact": "yes"}) == {"query": "1", "exact": True}
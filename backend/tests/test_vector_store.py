@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from vector_store import EmbeddingStore, normalize, recall_at_k
+
+
+def random_vectors(rows, dim=64, seed=0):
+    return np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+
+
+@pytest.fixture
+def storage_dir(tmp_path):
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("mode", ["float32", "int8", "binary"])
+def test_exact_vector_is_top_hit(mode, storage_dir):
+    vectors = random_vectors(500)
+    store = EmbeddingStore(mode, rescore_factor=8, storage_dir=storage_dir)
+    store.build(vectors)
+    for row in (0, 123, 499):
+        best_row, score = store.search(vectors[row], top_k=1)[0]
+        assert best_row == row
+        assert score == pytest.approx(1.0, abs=1e-5)
+    store.close()
+
+
+def test_int8_appends_do_not_requantize_existing_rows(storage_dir):
+    store = EmbeddingStore("int8", storage_dir=storage_dir)
+    store.append(random_vectors(200, seed=1))
+    before = store.compact.copy()
+    scale = store.scale.copy()
+    # a batch with a much larger range on one dimension is clipped, not rescaled
+    spiky = random_vectors(50, seed=2)
+    spiky[:, 0] = 100.0
+    store.append(spiky)
+    np.testing.assert_array_equal(store.scale, scale)
+    np.testing.assert_array_equal(store.compact[:200], before)
+    assert store.count == 250
+    store.close()
+
+
+def test_int8_recall_against_exact(storage_dir):
+    exact = EmbeddingStore("float32")
+    store = EmbeddingStore("int8", rescore_factor=4, storage_dir=storage_dir)
+    for seed in range(5):
+        batch = random_vectors(400, seed=seed)
+        exact.append(batch)
+        store.append(batch)
+    queries = random_vectors(20, seed=99)
+    assert recall_at_k(store, exact, queries, k=10) >= 0.95
+    store.close()
+
+
+@pytest.mark.parametrize("mode", ["float32", "int8"])
+def test_rewritten_drops_tombstones_and_renumbers(mode, storage_dir):
+    vectors = random_vectors(300)
+    store = EmbeddingStore(mode, storage_dir=storage_dir)
+    store.build(vectors)
+    store.delete([0, 10, 20])
+    assert store.tombstone_ratio() == pytest.approx(3 / 300)
+    assert all(row not in (0, 10, 20) for row, _ in store.search(vectors[10], top_k=5))
+
+    keep = np.flatnonzero(store.live)
+    rewritten = store.rewritten(keep)
+    assert rewritten.count == 297
+    assert rewritten.deleted == 0
+    np.testing.assert_allclose(rewritten.vectors(np.arange(297)), normalize(vectors[keep]), atol=1e-6)
+    if mode == "int8":
+        np.testing.assert_array_equal(rewritten.scale, store.scale)
+    store.close()
+    rewritten.close()
+
+
+def test_spilled_store_still_searches(storage_dir):
+    vectors = random_vectors(100)
+    store = EmbeddingStore("int8", storage_dir=storage_dir)
+    store.build(vectors)
+    freed = store.spill()
+    assert freed > 0 and store.spilled
+    assert store.search(vectors[42], top_k=1)[0][0] == 42
+    store.close()
+
+
+@pytest.mark.parametrize("mode", ["float32", "int8", "binary"])
+def test_appends_to_a_spilled_store_stay_on_disk(mode, storage_dir):
+    store = EmbeddingStore(mode, rescore_factor=8, storage_dir=storage_dir)
+    store.append(random_vectors(100, seed=1))
+    store.spill()
+    resident = store.memory_bytes()
+    extra = random_vectors(50, seed=2)
+    store.append(extra)
+    assert store.spilled
+    assert store.memory_bytes() == resident
+    assert store.count == 150
+    assert store.search(extra[7], top_k=1)[0][0] == 107
+    store.close()
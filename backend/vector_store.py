@@ -0,0 +1,288 @@
+import itertools
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Storage modes for the in-memory (coarse) copy of the embeddings.
+#   float32 - full precision, exact search, no rescoring
+#   int8    - per-dimension scalar quantization, 4x smaller
+#   binary  - one sign bit per dimension, 32x smaller, Hamming distance
+STORAGE_MODES = ("float32", "int8", "binary")
+
+_INT8_BLOCK_ROWS = 8192
+_store_ids = itertools.count()
+_REWRITE_BLOCK_ROWS = 8192
+# int8 ranges are calibrated once on the first batch with this much headroom;
+# later values outside the range are clipped, rescoring uses the exact vectors
+_INT8_HEADROOM = 1.25
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(x):
+        return _POPCOUNT_TABLE[x]
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingStore:
+    """
+    Holds chunk embeddings in a compact form for the coarse search pass and
+    keeps the full-precision vectors on disk for rescoring the shortlist.
+    """
+
+    def __init__(self, mode: str = "float32", rescore_factor: int = 4, storage_dir: Optional[str] = None):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {mode}")
+        self.mode = mode
+        self.id = next(_store_ids)  # tells stores apart, e.g. for the sharded copy
+        self.rescore_factor = rescore_factor
+        self.storage_dir = storage_dir or tempfile.gettempdir()
+        self.dim = 0
+        self.count = 0
+        self.compact = None   # float32 / int8 / packed uint8 matrix
+        self.scale = None     # int8 per-dimension scale
+        self._full_path = None
+        self._full = None     # lazily opened memmap of the float32 vectors
+        self._compact_path = None  # set while the compact matrix is spilled to disk
+        self.live = np.zeros(0, dtype=bool)  # False marks a tombstoned row
+        self.deleted = 0
+
+    def build(self, embeddings) -> None:
+        self.close()
+        self.count, self.dim = 0, 0
+        self.compact, self.scale = None, None
+        self.live = np.zeros(0, dtype=bool)
+        self.deleted = 0
+        self.append(embeddings)
+
+    def append(self, embeddings) -> np.ndarray:
+        """Add vectors to the end of the store and return their row ids."""
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.size == 0:
+            return np.arange(self.count, self.count)
+        if vectors.ndim != 2 or (self.count and vectors.shape[1] != self.dim):
+            raise ValueError("Expected a 2D embedding matrix matching the store dimension")
+        vectors = normalize(vectors)
+        rows = np.arange(self.count, self.count + len(vectors))
+        self.dim = vectors.shape[1]
+        self.live = np.concatenate([self.live, np.ones(len(vectors), dtype=bool)])
+
+        if self.mode == "float32":
+            self._append_compact(vectors)
+            self.count += len(vectors)
+            return rows
+
+        # full-precision copy goes to disk, only the shortlist is read back
+        if self._full_path is None:
+            fd, self._full_path = tempfile.mkstemp(prefix="embeddings_", suffix=".f32", dir=self.storage_dir)
+            os.close(fd)
+        with open(self._full_path, "ab") as f:
+            f.write(vectors.tobytes())
+        self._full = None
+        self.count += len(vectors)
+
+        if self.mode == "int8":
+            if self.scale is None:
+                self.scale = self._calibrate(vectors)
+            new_rows = self._quantize(vectors)
+        else:
+            new_rows = np.packbits(vectors > 0, axis=1)
+        self._append_compact(new_rows)
+        return rows
+
+    def _append_compact(self, new_rows: np.ndarray) -> None:
+        if not self.spilled:
+            self.compact = new_rows if self.compact is None else np.vstack([self.compact, new_rows])
+            return
+        # a spilled matrix grows on disk, reading it back would undo the spill
+        with open(self._compact_path, "ab") as f:
+            f.write(np.ascontiguousarray(new_rows).tobytes())
+        shape = (len(self.compact) + len(new_rows),) + self.compact.shape[1:]
+        self.compact = np.memmap(self._compact_path, dtype=self.compact.dtype, mode="r", shape=shape)
+
+    @staticmethod
+    def _calibrate(vectors: np.ndarray) -> np.ndarray:
+        """
+        Per-dimension int8 scale from the first batch. Components of unit
+        vectors are about 1/sqrt(dim) in size, so the range never drops below
+        four times that even when the batch is a single row, and never
+        exceeds 1. Fixing the scale keeps appends O(batch).
+        """
+        floor = min(1.0, 4.0 / np.sqrt(vectors.shape[1]))
+        value_range = np.clip(np.abs(vectors).max(axis=0) * _INT8_HEADROOM, floor, 1.0)
+        return (value_range / 127.0).astype(np.float32)
+
+    def delete(self, rows) -> None:
+        """Tombstone rows, searches skip them until the store is rewritten."""
+        rows = np.asarray(rows, dtype=np.int64)
+        self.deleted += int(self.live[rows].sum())
+        self.live[rows] = False
+
+    def live_candidates(self, candidates: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Drop tombstoned rows from `candidates`, None means every row."""
+        if not self.deleted:
+            return candidates
+        if candidates is None:
+            return np.flatnonzero(self.live)
+        candidates = np.asarray(candidates, dtype=np.int64)
+        return candidates[self.live[candidates]]
+
+    def tombstone_ratio(self) -> float:
+        return self.deleted / self.count if self.count else 0.0
+
+    def vectors(self, rows) -> np.ndarray:
+        """Full-precision vectors for the given rows."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if self.count == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.array(self._full_vectors()[rows])
+
+    def rewritten(self, keep) -> "EmbeddingStore":
+        """Return a new store holding only `keep`, renumbered from zero."""
+        store = EmbeddingStore(self.mode, rescore_factor=self.rescore_factor, storage_dir=self.storage_dir)
+        keep = np.asarray(keep, dtype=np.int64)
+        if self.scale is not None:
+            store.scale = self.scale.copy()  # same quantization, no need to recalibrate
+        # copied in blocks so the full-precision matrix is never read into memory at once
+        for start in range(0, len(keep), _REWRITE_BLOCK_ROWS):
+            store.append(self.vectors(keep[start:start + _REWRITE_BLOCK_ROWS]))
+        return store
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.round(vectors / self.scale), -127, 127).astype(np.int8)
+
+    @property
+    def spilled(self) -> bool:
+        return self._compact_path is not None
+
+    def spill(self) -> int:
+        """Move the compact matrix to a memory-mapped file, return the bytes freed."""
+        if self.compact is None or self.spilled:
+            return 0
+        freed = self.compact.nbytes
+        fd, path = tempfile.mkstemp(prefix="compact_", suffix=".bin", dir=self.storage_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(np.ascontiguousarray(self.compact).tobytes())
+        self.compact = np.memmap(path, dtype=self.compact.dtype, mode="r", shape=self.compact.shape)
+        self._compact_path = path
+        return freed
+
+    def close(self) -> None:
+        if self._compact_path and os.path.exists(self._compact_path):
+            self.compact = None
+            os.unlink(self._compact_path)
+        self._compact_path = None
+        self._full = None
+        if self._full_path and os.path.exists(self._full_path):
+            os.unlink(self._full_path)
+        self._full_path = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _full_vectors(self) -> np.ndarray:
+        if self.mode == "float32":
+            return self.compact
+        if self._full is None:
+            self._full = np.memmap(self._full_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        return self._full
+
+    def _coarse_scores(self, matrix: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.mode == "float32":
+            return matrix @ query
+        if self.mode == "int8":
+            # dequantize through the query instead of the matrix, in blocks so
+            # the float copy never grows to the size of the whole matrix
+            scaled = query * self.scale
+            scores = np.empty(len(matrix), dtype=np.float32)
+            for start in range(0, len(matrix), _INT8_BLOCK_ROWS):
+                block = matrix[start:start + _INT8_BLOCK_ROWS]
+                scores[start:start + len(block)] = block.astype(np.float32) @ scaled
+            return scores
+        packed_query = np.packbits(query > 0)
+        distances = _popcount(np.bitwise_xor(matrix, packed_query)).sum(axis=1, dtype=np.int32)
+        return -distances.astype(np.float32)
+
+    def search(self, query_embedding, top_k: int = 3, candidates: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        Return (row, cosine score) pairs for the best matching rows. When
+        `candidates` is given only those rows are scored.
+        """
+        candidates = self.live_candidates(candidates)
+        if candidates is None:
+            matrix = self.compact
+            row_ids = None
+            available = self.count
+        else:
+            row_ids = np.asarray(candidates, dtype=np.int64)
+            available = len(row_ids)
+            matrix = self.compact[row_ids] if available else None
+        if available == 0 or top_k <= 0:
+            return []
+        query = normalize(query_embedding).reshape(-1)
+        top_k = min(top_k, available)
+
+        coarse = self._coarse_scores(matrix, query)
+        if self.mode == "float32":
+            positions = np.argpartition(-coarse, top_k - 1)[:top_k]
+            rows = positions if row_ids is None else row_ids[positions]
+            scores = coarse[positions]
+        else:
+            shortlist = min(available, top_k * self.rescore_factor)
+            positions = np.argpartition(-coarse, shortlist - 1)[:shortlist]
+            rows = positions if row_ids is None else row_ids[positions]
+            rows.sort()  # sequential reads from the memmap
+            scores = self._full_vectors()[rows] @ query
+
+        order = np.argsort(-scores)[:top_k]
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def memory_bytes(self) -> int:
+        size = 0
+        if self.compact is not None and not self.spilled:
+            size += self.compact.nbytes
+        if self.scale is not None:
+            size += self.scale.nbytes
+        return size
+
+    def disk_bytes(self) -> int:
+        size = self.compact.nbytes if self.spilled else 0
+        if self.mode == "float32" or self.count == 0:
+            return size
+        return size + self.count * self.dim * 4
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "rows": self.count,
+            "deleted": self.deleted,
+            "dim": self.dim,
+            "memory_bytes": self.memory_bytes(),
+            "disk_bytes": self.disk_bytes(),
+            "spilled": self.spilled,
+        }
+
+
+def recall_at_k(store: EmbeddingStore, exact: EmbeddingStore, queries, k: int = 10) -> float:
+    """Fraction of the exact top-k rows that `store` also returns."""
+    hits = 0
+    total = 0
+    for query in np.atleast_2d(queries):
+        expected = {row for row, _ in exact.search(query, k)}
+        found = {row for row, _ in store.search(query, k)}
+        hits += len(expected & found)
+        total += len(expected)
+    return hits / total if total else 1.0